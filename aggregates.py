@@ -0,0 +1,170 @@
+import heapq
+import os
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import func
+
+from models import Response
+from shared import bus
+
+# -------------------------------------------------
+# CONFIGURATION
+# -------------------------------------------------
+CLOUD_CACHE_SIZE = int(os.getenv("CLOUD_CACHE_SIZE", "128"))
+
+
+# -------------------------------------------------
+# PER-SESSION WORD CLOUD
+# -------------------------------------------------
+class SessionCloud:
+    """word -> count and word -> distinct students for a single session."""
+
+    def __init__(self):
+        self.counts = {}
+        self.word_students = {}
+        self.students = set()
+        self.total = 0
+        # highest response id the rebuild counted; later records at or below it are repeats
+        self.last_id = 0
+
+    def add(self, word, student_id, n=1):
+        self.counts[word] = self.counts.get(word, 0) + n
+        self.word_students.setdefault(word, set()).add(student_id)
+        self.students.add(student_id)
+        self.total += n
+
+    def snapshot(self, top=None, min_count=1):
+        # most frequent first, ties broken alphabetically
+        items = [(-c, w) for w, c in self.counts.items() if c >= min_count]
+        if top is not None:
+            items = heapq.nsmallest(top, items)
+        else:
+            items.sort()
+        return {
+            "total_responses": self.total,
+            "distinct_words": len(self.counts),
+            "participants": len(self.students),
+            "words": [
+                {"word": w, "count": -c, "students": len(self.word_students[w])}
+                for c, w in items
+            ],
+        }
+
+
+# -------------------------------------------------
+# AGGREGATOR (LRU of SessionCloud keyed by session id)
+# -------------------------------------------------
+class WordCloudAggregator:
+    """Keeps live word clouds in memory.
+
+    Submissions are folded in with `record()` after they commit, with their
+    response id. A session that is not resident is rebuilt from the
+    responses table with a single GROUP BY the next time it is read; the
+    rebuild remembers the highest id it counted, so a record that reaches
+    this worker after the rebuild already read its row is not counted twice.
+    """
+
+    def __init__(self, maxsize=CLOUD_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._clouds = OrderedDict()
+        # session_id -> records that arrived while a rebuild was in flight,
+        # or None once the session was discarded and the rebuild is stale
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def record(self, session_id, word, student_id, response_id):
+        self._record(session_id, word, student_id, response_id)
+        bus.publish(
+            "cloud", op="record", session_id=session_id, word=word, student_id=student_id, response_id=response_id
+        )
+
+    def _record(self, session_id, word, student_id, response_id):
+        with self._lock:
+            cloud = self._clouds.get(session_id)
+            if cloud is not None:
+                if response_id > cloud.last_id:
+                    cloud.add(word, student_id)
+            elif self._loading.get(session_id) is not None:
+                self._loading[session_id].append((word, student_id, response_id))
+
+    def snapshot(self, db, session_id, top=None, min_count=1):
+        with self._lock:
+            cloud = self._clouds.get(session_id)
+            if cloud is not None:
+                self._clouds.move_to_end(session_id)
+                return cloud.snapshot(top, min_count)
+            self._loading[session_id] = []
+
+        try:
+            cloud = self._load(db, session_id)
+        finally:
+            with self._lock:
+                pending = self._loading.pop(session_id, None)
+
+        with self._lock:
+            if pending is not None and session_id not in self._clouds:
+                for word, student_id, response_id in pending:
+                    if response_id > cloud.last_id:
+                        cloud.add(word, student_id)
+                self._clouds[session_id] = cloud
+                while len(self._clouds) > self.maxsize:
+                    self._clouds.popitem(last=False)
+            return cloud.snapshot(top, min_count)
+
+    def discard(self, session_ids):
+        """Drop the clouds of `session_ids` (rows were deleted); they are rebuilt on the next read."""
+        session_ids = list(session_ids)
+        if session_ids:
+            self._discard(session_ids)
+            bus.publish("cloud", op="discard", session_ids=session_ids)
+
+    def clear(self):
+        self._clear()
+        bus.publish("cloud", op="clear")
+
+    def apply_remote(self, message):
+        """Submission or invalidation published by another worker."""
+        if message["op"] == "record":
+            self._record(message["session_id"], message["word"], message["student_id"], message["response_id"])
+        elif message["op"] == "discard":
+            self._discard(message["session_ids"])
+        elif message["op"] == "clear":
+            self._clear()
+
+    def _discard(self, session_ids):
+        with self._lock:
+            for session_id in session_ids:
+                self._clouds.pop(session_id, None)
+                if session_id in self._loading:
+                    self._loading[session_id] = None
+
+    def _clear(self):
+        with self._lock:
+            self._clouds.clear()
+            for session_id in self._loading:
+                self._loading[session_id] = None
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._clouds), "maxsize": self.maxsize, "rebuilds": self.rebuilds}
+
+    def _load(self, db, session_id):
+        rows = (
+            db.query(Response.normalized, Response.student_id, func.count(Response.id), func.max(Response.id))
+            .filter(Response.session_id == session_id)
+            .group_by(Response.normalized, Response.student_id)
+            .all()
+        )
+        cloud = SessionCloud()
+        for word, student_id, n, last_id in rows:
+            cloud.add(word, student_id, n)
+            cloud.last_id = max(cloud.last_id, last_id)
+        with self._lock:
+            self.rebuilds += 1
+        return cloud
+
+
+cloud_aggregator = WordCloudAggregator()
+bus.on("cloud", cloud_aggregator.apply_remote)
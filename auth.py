@@ -0,0 +1,69 @@
+import os
+import time
+import jwt
+from cache import token_cache
+
+# -------------------------------------------------
+# JWT CONFIGURATION
+# -------------------------------------------------
+SECRET_KEY = os.getenv("JWT_SECRET", "devsecret")
+ALGORITHM = "HS256"
+# student join tokens only need to outlive a class period
+STUDENT_TOKEN_TTL = int(os.getenv("STUDENT_TOKEN_TTL", str(3 * 60 * 60)))
+
+
+class TokenRevoked(jwt.InvalidTokenError):
+    pass
+
+
+def encode_token(payload: dict) -> str:
+    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def decode_token(token: str) -> dict:
+    """Verify `token` and return its claims, reusing earlier verifications.
+
+    Raises the same jwt exceptions as jwt.decode (plus TokenRevoked).
+    """
+    if token_cache.is_revoked(token):
+        raise TokenRevoked("token revoked")
+    claims = token_cache.get(token)
+    if claims is None:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        token_cache.put(token, claims)
+    return claims
+
+
+def revoke_token(token: str, claims: dict) -> None:
+    token_cache.revoke(token, claims.get("exp", 0))
+
+
+def rotate_secret_key(new_key: str) -> None:
+    """Switch the signing key; tokens verified under the old key are purged."""
+    global SECRET_KEY
+    SECRET_KEY = new_key
+    token_cache.clear()
+
+
+# -------------------------------------------------
+# STUDENT JOIN TOKENS
+# -------------------------------------------------
+def issue_student_token(session, student) -> str:
+    """Signed proof that `student` belongs to `session` (cache entries from check-session)."""
+    return encode_token({
+        "typ": "student",
+        "code": session.code,
+        "session_id": session.id,
+        "class_id": session.class_id,
+        "word_limit": session.word_limit,
+        "student_id": student.id,
+        "name": student.full_name,
+        "exp": int(time.time()) + STUDENT_TOKEN_TTL,
+    })
+
+
+def decode_student_token(token: str) -> dict:
+    claims = decode_token(token)
+    if claims.get("typ") != "student":
+        raise jwt.InvalidTokenError("not a student token")
+    return claims
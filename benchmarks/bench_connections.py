@@ -0,0 +1,218 @@
+"""Concurrent-connection ceiling per serving mode.
+
+For each async mode, starts `main.py` on a local port against a scratch
+SQLite database, seeds an active session and then ramps up websocket
+students in steps (--levels). At each level every new client completes
+the Socket.IO handshake and joins the session room; then one word is
+submitted and the time until every connected client has seen the
+resulting `cloud_delta` is measured. The ceiling is the last level where
+fewer than 1% of connects failed and the p95 join time stayed under
+--max-join-ms.
+
+    python benchmarks/bench_connections.py --modes threading,gevent --levels 100,250,500,1000
+
+The load generator itself runs on gevent so it is not the bottleneck.
+Needs gevent and websocket-client: pip install gevent "python-socketio[client]"
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import gevent
+import gevent.event
+import websocket  # websocket-client, installed with python-socketio[client]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def request(port, path, body=None, token=None):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = token
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=data, headers=headers)
+    with urllib.request.urlopen(req, timeout=30) as resp:
+        return json.loads(resp.read())
+
+
+def start_server(mode, port):
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        SOCKETIO_ASYNC_MODE=mode,
+        DATABASE_URL="sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_conn.db"),
+        BCRYPT_ROUNDS="4",
+        SERVER_MAX_CONNECTIONS="20000",
+    )
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py")], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            request(port, "/health")
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+def seed(port):
+    request(port, "/api/teacher/register", {"full_name": "Bench", "email": "bench@example.com", "password": "pw"})
+    token = request(port, "/api/teacher/login", {"email": "bench@example.com", "password": "pw"})["token"]
+    class_id = request(port, "/api/teacher/classes", {"name": "bench"}, token)["class"]["id"]
+    request(port, f"/api/teacher/classes/{class_id}/students", {"full_name": "Student", "file_number": "F1"}, token)
+    code = request(port, "/api/teacher/create-session", {"class_id": class_id, "word_limit": 1000}, token)["code"]
+    request(port, "/api/teacher/start-session", {"code": code}, token)
+    student_token = request(port, "/api/student/check-session", {"code": code, "file_number": "F1"})["student_token"]
+    return code, student_token
+
+
+class Student:
+    """Minimal Engine.IO v4 / Socket.IO websocket client."""
+
+    def __init__(self, port, code):
+        self.port = port
+        self.code = code
+        self.ws = None
+        self.deltas = 0
+        self.delta_event = gevent.event.Event()
+
+    def join(self, timeout):
+        with gevent.Timeout(timeout):
+            self.ws = websocket.create_connection(
+                f"ws://127.0.0.1:{self.port}/socket.io/?EIO=4&transport=websocket")
+            assert self.ws.recv().startswith("0")  # engine.io open
+            self.ws.send("40")
+            assert self.ws.recv().startswith("40")  # socket.io connect
+            self.ws.send('42' + json.dumps(["join_session", {"code": self.code}]))
+            while '"system"' not in self.ws.recv():
+                pass
+        gevent.spawn(self._listen)
+
+    def _listen(self):
+        try:
+            while True:
+                message = self.ws.recv()
+                if message == "2":
+                    self.ws.send("3")  # pong
+                elif message and '"cloud_delta"' in message:
+                    self.deltas += 1
+                    self.delta_event.set()
+        except Exception:
+            pass
+
+    def close(self):
+        if self.ws is not None:
+            try:
+                self.ws.shutdown()  # no close handshake; thousands of those take minutes
+            except Exception:
+                pass
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float("nan")
+
+
+def run_mode(mode, port, levels, max_join_ms, join_timeout):
+    proc = start_server(mode, port)
+    students = []
+    rows = []
+    try:
+        code, student_token = seed(port)
+        for level in levels:
+            new = [Student(port, code) for _ in range(level - len(students))]
+            joins, failures = [], 0
+
+            def join(student):
+                nonlocal failures
+                start = time.perf_counter()
+                try:
+                    student.join(join_timeout)
+                    joins.append(time.perf_counter() - start)
+                except BaseException:
+                    failures += 1
+                    student.close()
+
+            gevent.joinall([gevent.spawn(join, s) for s in new])
+            students += [s for s in new if s.ws is not None and s.ws.connected]
+
+            for s in students:
+                s.delta_event.clear()
+            start = time.perf_counter()
+            request(port, "/api/student/submit", {"token": student_token, "word": "ping"})
+            fanout = []
+            with gevent.Timeout(30, False):
+                for s in students:
+                    s.delta_event.wait()
+                    fanout.append(time.perf_counter() - start)
+            delivered = sum(1 for s in students if s.delta_event.is_set())
+
+            row = {
+                "mode": mode,
+                "level": level,
+                "connected": len(students),
+                "failed": failures,
+                "join_p50_ms": round(statistics.median(joins) * 1000, 1) if joins else None,
+                "join_p95_ms": round(pct(joins, 0.95) * 1000, 1) if joins else None,
+                "fanout_max_ms": round(max(fanout) * 1000, 1) if fanout else None,
+                "delivered": delivered,
+            }
+            row["ok"] = (
+                failures <= len(new) * 0.01
+                and row["join_p95_ms"] is not None
+                and row["join_p95_ms"] <= max_join_ms
+                and delivered == len(students)
+            )
+            rows.append(row)
+            print(f"{mode:<10} {level:>6} connected {len(students):>6}  failed {failures:>5}  "
+                  f"join p50 {row['join_p50_ms']} ms p95 {row['join_p95_ms']} ms  "
+                  f"fan-out {row['fanout_max_ms']} ms ({delivered}/{len(students)})"
+                  f"{'' if row['ok'] else '  <- over the limit'}")
+            if not row["ok"]:
+                break
+    finally:
+        for s in students:
+            s.close()
+        proc.terminate()
+        proc.wait(timeout=30)
+    passed = [r["level"] for r in rows if r["ok"]]
+    return rows, (max(passed) if passed else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", default="threading,gevent")
+    parser.add_argument("--levels", default="100,250,500,1000,2000")
+    parser.add_argument("--port", type=int, default=5090)
+    parser.add_argument("--max-join-ms", type=float, default=2000)
+    parser.add_argument("--join-timeout", type=float, default=10)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    levels = [int(x) for x in args.levels.split(",")]
+    results = {}
+    for i, mode in enumerate(args.modes.split(",")):
+        rows, ceiling = run_mode(mode, args.port + i, levels, args.max_join_ms, args.join_timeout)
+        results[mode] = {"ceiling": ceiling, "levels": rows}
+
+    print()
+    for mode, result in results.items():
+        print(f"{mode:<10} ceiling: {result['ceiling']} concurrent students")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
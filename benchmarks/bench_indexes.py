@@ -0,0 +1,160 @@
+"""Query-plan benchmark for the submit and check-session lookups.
+
+Seeds a large synthetic dataset into a scratch database, times the hot
+queries without the composite indexes, adds them, and times them again.
+
+    python benchmarks/bench_indexes.py                       # scratch SQLite file
+    python benchmarks/bench_indexes.py --url postgresql://... --responses 1000000
+
+The target database must be empty/disposable: its tables are dropped first.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import MetaData, UniqueConstraint, create_engine, text
+
+from db import Base
+import models  # noqa: F401  (registers the tables)
+
+NEW_INDEXES = {"uq_students_class_file", "ix_responses_session_student", "ix_sessions_class_id"}
+
+CREATE_INDEXES = [
+    "CREATE UNIQUE INDEX uq_students_class_file ON students (class_id, file_number)",
+    "CREATE INDEX ix_responses_session_student ON responses (session_id, student_id)",
+    "CREATE INDEX ix_sessions_class_id ON sessions (class_id)",
+]
+
+QUERIES = {
+    "submit: student by (class_id, file_number)":
+        "SELECT id, full_name FROM students WHERE class_id = :class_id AND file_number = :file_number",
+    "submit: response count by (session_id, student_id)":
+        "SELECT COUNT(*) FROM responses WHERE session_id = :session_id AND student_id = :student_id",
+    "check-session: session by code":
+        "SELECT id, is_active, word_limit, class_id FROM sessions WHERE code = :code",
+    "check-session: roster by class_id":
+        "SELECT id, file_number, full_name FROM students WHERE class_id = :class_id",
+}
+
+
+def baseline_metadata():
+    """The current tables minus the indexes/constraints this benchmark measures."""
+    md = MetaData()
+    for table in Base.metadata.sorted_tables:
+        copy = table.to_metadata(md)
+        for index in list(copy.indexes):
+            if index.name in NEW_INDEXES:
+                copy.indexes.discard(index)
+        for constraint in list(copy.constraints):
+            if isinstance(constraint, UniqueConstraint) and constraint.name in NEW_INDEXES:
+                copy.constraints.discard(constraint)
+    return md
+
+
+def insert_chunked(conn, statement, rows, chunk=20_000):
+    for i in range(0, len(rows), chunk):
+        conn.execute(text(statement), rows[i:i + chunk])
+
+
+def seed(engine, args):
+    rnd = random.Random(42)
+    n_students = args.classes * args.students
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO teachers (id, full_name, email, password_hash) VALUES (1, 'Bench', 'bench@example.com', 'x')")
+        )
+        insert_chunked(conn, "INSERT INTO classes (id, name, teacher_id) VALUES (:id, :name, 1)",
+                       [{"id": c + 1, "name": f"class {c}"} for c in range(args.classes)])
+        insert_chunked(conn, "INSERT INTO students (id, full_name, file_number, class_id) VALUES (:id, :n, :f, :c)",
+                       [{"id": s + 1, "n": f"student {s}", "f": f"F{s % args.students:05d}", "c": s // args.students + 1}
+                        for s in range(n_students)])
+        sessions = [{"id": i + 1, "code": f"S{i:05d}", "c": i % args.classes + 1} for i in range(args.sessions)]
+        insert_chunked(conn, "INSERT INTO sessions (id, code, is_active, word_limit, class_id) VALUES (:id, :code, true, 3, :c)",
+                       sessions)
+
+    print(f"seeding {args.responses:,} responses ...", flush=True)
+    batch = []
+    with engine.begin() as conn:
+        for r in range(args.responses):
+            s = sessions[rnd.randrange(args.sessions)]
+            student = (s["c"] - 1) * args.students + rnd.randrange(args.students) + 1
+            batch.append({"w": f"word{rnd.randrange(500)}", "st": student, "se": s["id"]})
+            if len(batch) == 50_000:
+                insert_chunked(conn, "INSERT INTO responses (word, student_id, session_id) VALUES (:w, :st, :se)", batch)
+                batch = []
+        insert_chunked(conn, "INSERT INTO responses (word, student_id, session_id) VALUES (:w, :st, :se)", batch)
+    return sessions
+
+
+def sample_params(args, sessions, rnd):
+    s = sessions[rnd.randrange(len(sessions))]
+    local = rnd.randrange(args.students)
+    return {
+        "class_id": s["c"],
+        "file_number": f"F{local:05d}",
+        "session_id": s["id"],
+        "student_id": (s["c"] - 1) * args.students + local + 1,
+        "code": s["code"],
+    }
+
+
+def measure(engine, args, sessions):
+    rnd = random.Random(7)
+    params = [sample_params(args, sessions, rnd) for _ in range(args.samples)]
+    results = {}
+    with engine.connect() as conn:
+        for label, sql in QUERIES.items():
+            stmt = text(sql)
+            timings = []
+            for p in params:
+                start = time.perf_counter()
+                conn.execute(stmt, p).fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            results[label] = (statistics.median(timings), timings[int(len(timings) * 0.95) - 1])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="database URL (default: scratch SQLite file)")
+    parser.add_argument("--classes", type=int, default=500)
+    parser.add_argument("--students", type=int, default=40, help="students per class")
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--responses", type=int, default=1_000_000)
+    parser.add_argument("--samples", type=int, default=200, help="timed executions per query")
+    args = parser.parse_args()
+
+    url = args.url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_indexes.db")
+    engine = create_engine(url)
+    md = baseline_metadata()
+    md.drop_all(engine)
+    md.create_all(engine)
+
+    sessions = seed(engine, args)
+    before = measure(engine, args, sessions)
+
+    with engine.begin() as conn:
+        for statement in CREATE_INDEXES:
+            conn.execute(text(statement))
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("ANALYZE"))
+    after = measure(engine, args, sessions)
+
+    print(f"\n{'query':<52} {'before p50/p95 ms':>20} {'after p50/p95 ms':>20}")
+    for label in QUERIES:
+        b, a = before[label], after[label]
+        print(f"{label:<52} {b[0]:>9.3f} / {b[1]:<8.3f} {a[0]:>9.3f} / {a[1]:<8.3f}")
+
+    md.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main()
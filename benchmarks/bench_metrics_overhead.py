@@ -0,0 +1,95 @@
+"""Cost of the /metrics instrumentation on the submit path.
+
+Runs the same workload twice in fresh processes, once with
+METRICS_ENABLED=false and once with it on: a scratch SQLite database
+(or DATABASE_URL if set), one active session, and `--words` submissions
+per student through POST /api/student/submit via the Flask test client,
+so the numbers are server-side cost without network noise. Reports
+p50/p95 latency for both runs and the difference.
+
+    python benchmarks/bench_metrics_overhead.py --students 20 --words 50
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(students, words):
+    sys.path.insert(0, ROOT)
+    from main import app
+
+    c = app.test_client()
+    c.post("/api/teacher/register", json={"full_name": "Bench", "email": "bench@example.com", "password": "pw"})
+    token = c.post("/api/teacher/login", json={"email": "bench@example.com", "password": "pw"}).json["token"]
+    headers = {"Authorization": token}
+    class_id = c.post("/api/teacher/classes", json={"name": "bench"}, headers=headers).json["class"]["id"]
+    for i in range(students):
+        c.post(f"/api/teacher/classes/{class_id}/students",
+               json={"full_name": f"Student {i}", "file_number": f"F{i}"}, headers=headers)
+    code = c.post("/api/teacher/create-session",
+                  json={"class_id": class_id, "word_limit": words}, headers=headers).json["code"]
+    c.post("/api/teacher/start-session", json={"code": code}, headers=headers)
+    tokens = [
+        c.post("/api/student/check-session", json={"code": code, "file_number": f"F{i}"}).json["student_token"]
+        for i in range(students)
+    ]
+
+    latencies = []
+    for w in range(words):
+        for token in tokens:
+            start = time.perf_counter()
+            resp = c.post("/api/student/submit", json={"token": token, "word": f"word{w % 25}"})
+            latencies.append(time.perf_counter() - start)
+            assert resp.status_code == 200, resp.status_code
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+        "metrics_bytes": len(c.get("/metrics").data),
+    }
+
+
+def run(enabled, args):
+    env = dict(
+        os.environ,
+        METRICS_ENABLED="true" if enabled else "false",
+        DATABASE_URL=os.getenv("DATABASE_URL") or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_metrics.db"),
+        BCRYPT_ROUNDS="4",
+        RATE_LIMITING="false",
+    )
+    out = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), "--child", "--students", str(args.students),
+         "--words", str(args.words)],
+        env=env, text=True,
+    )
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=20)
+    parser.add_argument("--words", type=int, default=50, help="words per student")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.students, args.words)))
+        return
+
+    off, on = run(False, args), run(True, args)
+    print(f"{args.students} students x {args.words} words")
+    for label, result in (("metrics off", off), ("metrics on", on)):
+        print(f"{label:<12} p50 {result['p50_ms']:7.3f} ms   p95 {result['p95_ms']:7.3f} ms")
+    print(f"overhead     p50 {on['p50_ms'] - off['p50_ms']:+7.3f} ms   p95 {on['p95_ms'] - off['p95_ms']:+7.3f} ms"
+          f"   ({(on['p50_ms'] - off['p50_ms']) / off['p50_ms'] * 100:+.1f}% at p50)")
+
+
+if __name__ == "__main__":
+    main()
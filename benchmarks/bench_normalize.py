@@ -0,0 +1,72 @@
+"""Throughput of the ingest-time word normalization pipeline.
+
+Normalizes a classroom-like stream of submissions: `--distinct` base
+words, each submitted in several spellings (case, spacing, punctuation,
+full-width forms), shuffled into `--words` submissions. Reports words/s
+with a cold LRU (every spelling seen for the first time) and for the
+whole stream, where repeats hit the cache.
+
+    python benchmarks/bench_normalize.py --words 200000 --distinct 2000
+    WORD_STEMMING=true WORD_STOPWORDS=en python benchmarks/bench_normalize.py
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from normalize import Stopword, normalize_stats, normalize_word
+
+VARIANTS = [
+    lambda w: w,
+    str.upper,
+    str.title,
+    lambda w: f"  {w} ",
+    lambda w: f"{w}!",
+    lambda w: f"{w}s",
+    lambda w: w.translate({c: c + 0xFEE0 for c in range(0x21, 0x7F)}),  # full-width
+]
+
+
+def make_stream(words, distinct, seed=7):
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    base = ["".join(rng.choice(letters) for _ in range(rng.randint(3, 12))) for _ in range(distinct)]
+    spellings = [variant(w) for w in base for variant in VARIANTS]
+    return spellings, [rng.choice(spellings) for _ in range(words)]
+
+
+def run(words):
+    start = time.perf_counter()
+    for w in words:
+        try:
+            normalize_word(w)
+        except Stopword:
+            pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--words", type=int, default=200000, help="submissions in the stream")
+    parser.add_argument("--distinct", type=int, default=2000, help="distinct base words")
+    args = parser.parse_args()
+
+    spellings, stream = make_stream(args.words, args.distinct)
+    normalize_word.cache_clear()
+    cold = run(spellings)
+    normalize_word.cache_clear()
+    warm = run(stream)
+
+    print(f"{len(spellings)} distinct spellings, {len(stream)} submissions")
+    print(f"cold (all misses) {len(spellings) / cold:>12,.0f} words/s")
+    print(f"stream (LRU)      {len(stream) / warm:>12,.0f} words/s")
+    stats = normalize_stats()
+    print(f"cache hits {stats['cache_hits']}, misses {stats['cache_misses']}")
+
+
+if __name__ == "__main__":
+    main()
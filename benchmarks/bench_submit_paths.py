@@ -0,0 +1,140 @@
+"""Side-by-side benchmark: word submission over HTTP vs over Socket.IO.
+
+Boots the app on a local port against a scratch SQLite database (or
+DATABASE_URL if set), seeds one class and an active session, then has
+`--clients` concurrent students submit `--words` words each through
+
+  * POST /api/student/submit (keep-alive HTTP connection per student)
+  * the `submit_word` Socket.IO event with acknowledgements
+
+and reports throughput and p50/p95/p99 latency for both.
+
+    python benchmarks/bench_submit_paths.py --clients 20 --words 50
+
+Needs the Socket.IO client extras: pip install "python-socketio[client]"
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_submit.db")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# measuring raw submit throughput, not the per-student limiter
+os.environ.setdefault("RATE_LIMITING", "false")
+
+import socketio as socketio_client  # python-socketio client
+
+from main import app, socketio
+
+
+def seed(clients, words):
+    c = app.test_client()
+    c.post("/api/teacher/register", json={"full_name": "Bench", "email": "bench@example.com", "password": "pw"})
+    token = c.post("/api/teacher/login", json={"email": "bench@example.com", "password": "pw"}).json["token"]
+    headers = {"Authorization": token}
+    class_id = c.post("/api/teacher/classes", json={"name": "bench"}, headers=headers).json["class"]["id"]
+    for i in range(clients):
+        c.post(f"/api/teacher/classes/{class_id}/students",
+               json={"full_name": f"Student {i}", "file_number": f"F{i}"}, headers=headers)
+    codes = []
+    # one session per path so both start from an empty word-limit counter
+    for _ in range(2):
+        code = c.post("/api/teacher/create-session",
+                      json={"class_id": class_id, "word_limit": words}, headers=headers).json["code"]
+        c.post("/api/teacher/start-session", json={"code": code}, headers=headers)
+        codes.append(code)
+    return codes
+
+
+def student_tokens(code, clients):
+    c = app.test_client()
+    return [
+        c.post("/api/student/check-session", json={"code": code, "file_number": f"F{i}"}).json["student_token"]
+        for i in range(clients)
+    ]
+
+
+def run_http(port, tokens, words):
+    def student(token, latencies):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        headers = {"Content-Type": "application/json", "Origin": "http://localhost:5500"}
+        for w in range(words):
+            body = json.dumps({"token": token, "word": f"word{w % 25}"})
+            start = time.perf_counter()
+            conn.request("POST", "/api/student/submit", body=body, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            latencies.append(time.perf_counter() - start)
+            assert resp.status == 200, resp.status
+        conn.close()
+
+    return run_students(student, tokens)
+
+
+def run_socket(port, tokens, words):
+    def student(token, latencies):
+        client = socketio_client.Client()
+        client.connect(f"http://127.0.0.1:{port}", transports=["websocket"])
+        for w in range(words):
+            start = time.perf_counter()
+            ack = client.call("submit_word", {"token": token, "word": f"word{w % 25}"}, timeout=30)
+            latencies.append(time.perf_counter() - start)
+            assert ack["success"], ack
+        client.disconnect()
+
+    return run_students(student, tokens)
+
+
+def run_students(student, tokens):
+    per_student = [[] for _ in tokens]
+    threads = [threading.Thread(target=student, args=(t, lat)) for t, lat in zip(tokens, per_student)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies = sorted(x for lat in per_student for x in lat)
+    return elapsed, latencies
+
+
+def report(label, elapsed, latencies):
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"{label:<10} {len(latencies) / elapsed:>9.0f} words/s   "
+          f"p50 {statistics.median(latencies) * 1000:7.2f} ms   p95 {pct(0.95):7.2f} ms   p99 {pct(0.99):7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--words", type=int, default=50, help="words per student")
+    parser.add_argument("--port", type=int, default=5077)
+    args = parser.parse_args()
+
+    http_code, socket_code = seed(args.clients, args.words)
+    server = threading.Thread(
+        target=socketio.run,
+        args=(app,),
+        kwargs={"host": "127.0.0.1", "port": args.port, "allow_unsafe_werkzeug": True, "log_output": False},
+        daemon=True,
+    )
+    server.start()
+    time.sleep(1.0)
+
+    print(f"{args.clients} students x {args.words} words")
+    report("http", *run_http(args.port, student_tokens(http_code, args.clients), args.words))
+    report("socket.io", *run_socket(args.port, student_tokens(socket_code, args.clients), args.words))
+
+
+if __name__ == "__main__":
+    main()
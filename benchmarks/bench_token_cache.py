@@ -0,0 +1,54 @@
+"""Micro-benchmark: cached vs uncached teacher JWT verification.
+
+Run from the repository root:
+
+    python benchmarks/bench_token_cache.py --iterations 200000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# the models are imported transitively but never queried here
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import jwt
+import auth
+
+
+def bench(label, fn, tokens, iterations):
+    n = len(tokens)
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(tokens[i % n])
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {iterations / elapsed:>12,.0f} verifications/s  ({elapsed * 1e6 / iterations:.2f} us each)")
+    return iterations / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=100_000)
+    parser.add_argument("--tokens", type=int, default=50, help="distinct tokens in rotation (e.g. teachers online)")
+    args = parser.parse_args()
+
+    exp = datetime.utcnow() + timedelta(hours=1)
+    tokens = [
+        auth.encode_token({"teacher_id": i, "email": f"t{i}@example.com", "exp": exp})
+        for i in range(args.tokens)
+    ]
+
+    uncached = bench(
+        "uncached",
+        lambda t: jwt.decode(t, auth.SECRET_KEY, algorithms=[auth.ALGORITHM]),
+        tokens,
+        args.iterations,
+    )
+    cached = bench("cached", auth.decode_token, tokens, args.iterations)
+    print(f"speedup    {cached / uncached:>12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
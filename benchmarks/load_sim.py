@@ -0,0 +1,283 @@
+"""Classroom load simulation.
+
+Boots the app on a local port against a scratch SQLite database (or
+DATABASE_URL if set, e.g. a local Postgres), seeds K teachers, each with
+one class of M students, through the /api/teacher routes, and starts a
+session per class. Then, per classroom, a teacher dashboard connects over
+Socket.IO and M students join through /check-session, open their own
+Socket.IO connection, join the room and submit words in bursts.
+
+Reports p50/p95/p99 submit latency, end-to-end delivery latency (submit
+sent -> word seen in the teacher's `cloud_delta`) and DB queries per
+submit, and writes everything as JSON so runs can be compared:
+
+    python benchmarks/load_sim.py --classrooms 4 --students 25 --out before.json
+    python benchmarks/load_sim.py --classrooms 4 --students 25 --compare before.json
+
+Needs the Socket.IO client extras: pip install "python-socketio[client]"
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "load_sim.db")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import socketio as socketio_client  # python-socketio client
+from sqlalchemy import event
+
+from db import engine
+from main import app, socketio
+from normalize import normalize_word
+
+ORIGIN = {"Content-Type": "application/json", "Origin": "http://localhost:5500"}
+
+
+# -------------------------------------------------
+# MEASUREMENT HELPERS
+# -------------------------------------------------
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def pct(p):
+        return round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 2)
+
+    return {"count": len(values), "p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99),
+            "max_ms": round(values[-1] * 1000, 2)}
+
+
+def call(conn, method, path, body=None, headers=None):
+    conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                 headers={**ORIGIN, **(headers or {})})
+    resp = conn.getresponse()
+    return resp.status, json.loads(resp.read() or b"{}")
+
+
+# -------------------------------------------------
+# SEEDING (through the teacher routes)
+# -------------------------------------------------
+def seed(port, classrooms, students, word_limit):
+    sessions = []
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    for k in range(classrooms):
+        email = f"teacher{k}@example.com"
+        call(conn, "POST", "/api/teacher/register", {"full_name": f"Teacher {k}", "email": email, "password": "pw"})
+        _, login = call(conn, "POST", "/api/teacher/login", {"email": email, "password": "pw"})
+        auth = {"Authorization": login["token"]}
+        _, created = call(conn, "POST", "/api/teacher/classes", {"name": f"class {k}"}, auth)
+        class_id = created["class"]["id"]
+        for m in range(students):
+            call(conn, "POST", f"/api/teacher/classes/{class_id}/students",
+                 {"full_name": f"Student {k}-{m}", "file_number": f"F{m}"}, auth)
+        _, session = call(conn, "POST", "/api/teacher/create-session",
+                          {"class_id": class_id, "word_limit": word_limit}, auth)
+        call(conn, "POST", "/api/teacher/start-session", {"code": session["code"]}, auth)
+        sessions.append(session["code"])
+    conn.close()
+    return sessions
+
+
+# -------------------------------------------------
+# SIMULATED CLASSROOM
+# -------------------------------------------------
+class Classroom:
+    def __init__(self, port, code, students, args, results):
+        self.port = port
+        self.code = code
+        self.students = students
+        self.args = args
+        self.results = results
+        # normalized key -> perf_counter() when the submit was sent;
+        # cloud_delta carries the keys, not the words as typed
+        self.sent = {}
+        self.lock = threading.Lock()
+        self.dashboard = socketio_client.Client(reconnection=False)
+        self.dashboard.on("cloud_delta", self.on_delta)
+
+    def on_delta(self, delta):
+        now = time.perf_counter()
+        with self.lock:
+            for word in delta["words"]:
+                sent = self.sent.pop(word, None)
+                if sent is not None:
+                    self.results["delivery"].append(now - sent)
+
+    def connect_dashboard(self):
+        self.dashboard.connect(f"http://127.0.0.1:{self.port}", transports=["websocket"])
+        self.dashboard.call("join_session", {"code": self.code}, timeout=30)
+
+    def student(self, m, joined, start):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port)
+        client = socketio_client.Client(reconnection=False)
+        try:
+            t0 = time.perf_counter()
+            _, body = call(conn, "POST", "/api/student/check-session", {"code": self.code, "file_number": f"F{m}"})
+            token = body["student_token"]
+            client.connect(f"http://127.0.0.1:{self.port}", transports=["websocket"])
+            client.emit("join_session", {"code": self.code})
+            self.results["join"].append(time.perf_counter() - t0)
+        except Exception as e:
+            self.results["errors"].append(f"join: {e}")
+            return
+        finally:
+            joined.wait()
+
+        start.wait()
+        try:
+            for b in range(self.args.bursts):
+                for w in range(self.args.burst_size):
+                    word = f"{self.code}-{m}-{b}-{w}"
+                    key = normalize_word(word)
+                    with self.lock:
+                        self.sent[key] = time.perf_counter()
+                    t0 = time.perf_counter()
+                    if self.args.via == "socket":
+                        ack = client.call("submit_word", {"token": token, "word": word}, timeout=30)
+                        status = ack["status"]
+                    else:
+                        status, _ = call(conn, "POST", "/api/student/submit", {"token": token, "word": word})
+                    self.results["submit"].append(time.perf_counter() - t0)
+                    self.results["status"][status] = self.results["status"].get(status, 0) + 1
+                    if status != 200:
+                        with self.lock:
+                            self.sent.pop(key, None)
+                time.sleep(self.args.burst_gap)
+        except Exception as e:
+            self.results["errors"].append(f"submit: {e}")
+        finally:
+            client.disconnect()
+            conn.close()
+
+
+def simulate(args):
+    queries = QueryCounter()
+    server = threading.Thread(
+        target=socketio.run,
+        args=(app,),
+        kwargs={"host": "127.0.0.1", "port": args.port, "allow_unsafe_werkzeug": True, "log_output": False},
+        daemon=True,
+    )
+    server.start()
+    time.sleep(1.0)
+
+    codes = seed(args.port, args.classrooms, args.students, args.bursts * args.burst_size)
+    results = {"join": [], "submit": [], "delivery": [], "status": {}, "errors": []}
+    rooms = [Classroom(args.port, code, args.students, args, results) for code in codes]
+    for room in rooms:
+        room.connect_dashboard()
+
+    total = args.classrooms * args.students
+    joined = threading.Barrier(total + 1)
+    start = threading.Event()
+    threads = [
+        threading.Thread(target=room.student, args=(m, joined, start), daemon=True)
+        for room in rooms for m in range(args.students)
+    ]
+    for t in threads:
+        t.start()
+    joined.wait()
+
+    before = queries.count
+    t0 = time.perf_counter()
+    start.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    # let the last coalescer tick reach the dashboards
+    time.sleep(1.0)
+    submit_queries = queries.count - before
+    for room in rooms:
+        room.dashboard.disconnect()
+
+    submits = len(results["submit"])
+    return {
+        "config": {
+            "classrooms": args.classrooms,
+            "students": args.students,
+            "bursts": args.bursts,
+            "burst_size": args.burst_size,
+            "burst_gap": args.burst_gap,
+            "via": args.via,
+            "database": engine.dialect.name,
+        },
+        "commit": git_commit(),
+        "elapsed_s": round(elapsed, 3),
+        "submits_per_s": round(submits / elapsed, 1) if elapsed else None,
+        "status_counts": {str(k): v for k, v in sorted(results["status"].items())},
+        "join_latency": percentiles(results["join"]),
+        "submit_latency": percentiles(results["submit"]),
+        "delivery_latency": percentiles(results["delivery"]),
+        "undelivered": sum(len(room.sent) for room in rooms),
+        "queries_per_submit": round(submit_queries / submits, 2) if submits else None,
+        "errors": results["errors"][:20],
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} (commit {baseline.get('commit')}):")
+    for section in ("submit_latency", "delivery_latency"):
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            old, new = baseline.get(section, {}).get(key), result[section].get(key)
+            if old and new is not None:
+                print(f"  {section}.{key:<7} {old:>9.2f} -> {new:>9.2f}  ({(new - old) / old * 100:+.1f}%)")
+    for key in ("queries_per_submit", "submits_per_s"):
+        old, new = baseline.get(key), result.get(key)
+        if old and new is not None:
+            print(f"  {key:<24} {old:>9} -> {new:>9}  ({(new - old) / old * 100:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--classrooms", type=int, default=4, help="K concurrent classrooms")
+    parser.add_argument("--students", type=int, default=25, help="M students per classroom")
+    parser.add_argument("--bursts", type=int, default=3)
+    parser.add_argument("--burst-size", type=int, default=3, help="words per burst")
+    parser.add_argument("--burst-gap", type=float, default=1.0, help="seconds between a student's bursts")
+    parser.add_argument("--via", choices=("http", "socket"), default="http")
+    parser.add_argument("--port", type=int, default=5078)
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    args = parser.parse_args()
+
+    result = simulate(args)
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        compare(result, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from models import Session, Classroom, Student, Teacher
+from shared import bus
+
+# -------------------------------------------------
+# CONFIGURATION
+# -------------------------------------------------
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "30"))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "256"))
+# codes that matched no session are remembered briefly, in their own LRU so a
+# flood of made-up codes cannot evict real sessions
+SESSION_CACHE_MISSING_TTL = float(os.getenv("SESSION_CACHE_MISSING_TTL", "5"))
+SESSION_CACHE_MISSING_SIZE = int(os.getenv("SESSION_CACHE_MISSING_SIZE", "4096"))
+
+# -------------------------------------------------
+# CACHE ENTRIES
+# -------------------------------------------------
+# Plain snapshots (no ORM objects) so entries can be shared across
+# requests and threads without being bound to a closed db session.
+CachedStudent = namedtuple("CachedStudent", ["id", "full_name"])
+CachedSession = namedtuple(
+    "CachedSession",
+    [
+        "id",
+        "code",
+        "is_active",
+        "word_limit",
+        "slide_hash",
+        "class_id",
+        "teacher_id",
+        "teacher_name",
+        "students",
+    ],
+)
+
+
+# -------------------------------------------------
+# SESSION / ROSTER CACHE
+# -------------------------------------------------
+class SessionCache:
+    """TTL + LRU cache of session state and class roster keyed by session code."""
+
+    def __init__(self, maxsize=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # code -> (expires_at, CachedSession)
+        self._missing = OrderedDict()  # code -> expires_at
+        self._lock = threading.Lock()
+        # bumped on every invalidation so a load that raced with one is not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.missing_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, db, code):
+        """Return the cached entry for `code`, loading it with `db` on a miss.
+
+        Returns None if no session with this code exists; that answer is
+        kept for SESSION_CACHE_MISSING_TTL seconds.
+        """
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(code)
+            if item is not None:
+                expires_at, entry = item
+                if expires_at > now:
+                    self._entries.move_to_end(code)
+                    self.hits += 1
+                    return entry
+                del self._entries[code]
+                self.expirations += 1
+            missing_until = self._missing.get(code)
+            if missing_until is not None:
+                if missing_until > now:
+                    self.missing_hits += 1
+                    return None
+                del self._missing[code]
+            self.misses += 1
+            generation = self._generation
+
+        entry = self._load(db, code)
+
+        with self._lock:
+            if generation == self._generation:
+                if entry is None:
+                    self._missing[code] = time.monotonic() + SESSION_CACHE_MISSING_TTL
+                    while len(self._missing) > SESSION_CACHE_MISSING_SIZE:
+                        self._missing.popitem(last=False)
+                else:
+                    self._entries[code] = (time.monotonic() + self.ttl, entry)
+                    self._entries.move_to_end(code)
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+        return entry
+
+    def is_active(self, db, code, session_id):
+        """Active flag of a token's session, from the cached entry (loaded on a miss).
+
+        Refilling the entry keeps a burst of token submissions after it
+        expires down to one load, not one lookup per submission.
+        """
+        entry = self.get(db, code)
+        return entry is not None and entry.id == session_id and entry.is_active
+
+    def invalidate(self, code):
+        self._invalidate(code)
+        bus.publish("session_cache", op="invalidate", code=code)
+
+    def invalidate_class(self, class_id):
+        """Drop every cached session that belongs to `class_id` (roster changed)."""
+        self._invalidate_class(class_id)
+        bus.publish("session_cache", op="invalidate_class", class_id=class_id)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._missing.clear()
+
+    def apply_remote(self, message):
+        """Invalidation published by another worker."""
+        if message["op"] == "invalidate":
+            self._invalidate(message["code"])
+        elif message["op"] == "invalidate_class":
+            self._invalidate_class(message["class_id"])
+
+    def _invalidate(self, code):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            self._entries.pop(code, None)
+            self._missing.pop(code, None)
+
+    def _invalidate_class(self, class_id):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            stale = [code for code, (_, e) in self._entries.items() if e.class_id == class_id]
+            for code in stale:
+                del self._entries[code]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "missing": len(self._missing),
+                "missing_hits": self.missing_hits,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    @staticmethod
+    def _load(db, code):
+        row = (
+            db.query(
+                Session.id,
+                Session.code,
+                Session.is_active,
+                Session.word_limit,
+                Session.slide_hash,
+                Classroom.id.label("class_id"),
+                Teacher.id.label("teacher_id"),
+                Teacher.full_name,
+            )
+            .outerjoin(Classroom, Classroom.id == Session.class_id)
+            .outerjoin(Teacher, Teacher.id == Classroom.teacher_id)
+            .filter(Session.code == code)
+            .first()
+        )
+        if not row:
+            return None
+
+        students = {}
+        if row.class_id is not None:
+            roster = (
+                db.query(Student.id, Student.file_number, Student.full_name)
+                .filter(Student.class_id == row.class_id)
+                .all()
+            )
+            students = {s.file_number: CachedStudent(s.id, s.full_name) for s in roster}
+
+        return CachedSession(
+            id=row.id,
+            code=row.code,
+            is_active=row.is_active,
+            word_limit=row.word_limit,
+            slide_hash=row.slide_hash,
+            class_id=row.class_id,
+            teacher_id=row.teacher_id,
+            teacher_name=row.full_name,
+            students=students,
+        )
+
+
+session_cache = SessionCache()
+bus.on("session_cache", session_cache.apply_remote)
+
+
+# -------------------------------------------------
+# VERIFIED TOKEN CACHE
+# -------------------------------------------------
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "1024"))
+
+
+def token_digest(token):
+    return hashlib.sha256(token.encode()).digest()
+
+
+class TokenCache:
+    """LRU of verified JWT claims keyed by token digest, valid until `exp`.
+
+    Revoked tokens are remembered (until their own `exp`) so a revoked
+    token is not simply re-verified and cached again.
+    """
+
+    def __init__(self, maxsize=TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # digest -> claims
+        self._revoked = {}  # digest -> exp
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token):
+        """Cached claims for `token`, or None if absent, expired or revoked."""
+        digest = token_digest(token)
+        with self._lock:
+            claims = self._entries.get(digest)
+            if claims is not None:
+                if claims.get("exp", 0) > time.time():
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    return claims
+                del self._entries[digest]
+            self.misses += 1
+            return None
+
+    def put(self, token, claims):
+        digest = token_digest(token)
+        with self._lock:
+            if digest in self._revoked:
+                return
+            self._entries[digest] = claims
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def is_revoked(self, token):
+        digest = token_digest(token)
+        with self._lock:
+            exp = self._revoked.get(digest)
+            if exp is None:
+                return False
+            if exp <= time.time():
+                del self._revoked[digest]
+                return False
+            return True
+
+    def revoke(self, token, exp):
+        """Purge `token` and refuse it until `exp` (e.g. on logout)."""
+        digest = token_digest(token)
+        self._revoke(digest, exp)
+        bus.publish("token_cache", digest=digest.hex(), exp=exp)
+
+    def apply_remote(self, message):
+        """Revocation published by another worker."""
+        self._revoke(bytes.fromhex(message["digest"]), message["exp"])
+
+    def _revoke(self, digest, exp):
+        now = time.time()
+        with self._lock:
+            self._entries.pop(digest, None)
+            self._revoked[digest] = exp
+            # expired tokens are rejected by jwt anyway; keep the list short
+            for d in [d for d, e in self._revoked.items() if e <= now]:
+                del self._revoked[d]
+
+    def clear(self):
+        """Drop every cached token, e.g. after rotating the signing key."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "revoked": len(self._revoked),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+token_cache = TokenCache()
+bus.on("token_cache", token_cache.apply_remote)
@@ -1,8 +1,12 @@
 import os
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event, exc
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from dotenv import load_dotenv
+from metrics import METRICS_ENABLED, Histogram, Gauge, add_query_to_tally
+from serving import SOCKETIO_ASYNC_MODE, make_psycopg2_green
 
 # -------------------------------------------------
 # LOAD ENVIRONMENT VARIABLES
@@ -23,13 +27,156 @@ if not DATABASE_URL:
     DB_NAME = os.getenv("DB_NAME", "wordcloud_db")
     DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# -------------------------------------------------
+# POOL CONFIGURATION
+# -------------------------------------------------
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# recycle before Render's proxy drops idle connections
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+# a suspended Render database takes a while to wake up; keep retrying connects
+DB_CONNECT_RETRIES = int(os.getenv("DB_CONNECT_RETRIES", "6"))
+DB_RETRY_BACKOFF = float(os.getenv("DB_RETRY_BACKOFF", "0.5"))
+DB_RETRY_BACKOFF_MAX = float(os.getenv("DB_RETRY_BACKOFF_MAX", "8"))
+DB_WARMUP_CONNECTIONS = int(os.getenv("DB_WARMUP_CONNECTIONS", str(DB_POOL_SIZE)))
+
+pool_checkout_wait = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection")
+pool_timeouts = 0
+connect_retries = 0
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited."""
+
+    def connect(self):
+        global pool_timeouts
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            pool_timeouts += 1
+            raise
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - start)
+
+
 # -------------------------------------------------
 # SQLALCHEMY ENGINE + SESSION
 # -------------------------------------------------
-engine = create_engine(DATABASE_URL)
+engine_options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+if DATABASE_URL.startswith("sqlite"):
+    # in-memory SQLite needs SQLAlchemy's default single-connection pool
+    if ":memory:" not in DATABASE_URL and DATABASE_URL.rstrip("/") != "sqlite:":
+        engine_options.update(poolclass=TimedQueuePool, pool_size=DB_POOL_SIZE,
+                              max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+else:
+    engine_options.update(
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        connect_args={"connect_timeout": DB_CONNECT_TIMEOUT},
+    )
+
+if SOCKETIO_ASYNC_MODE == "gevent" and DATABASE_URL.startswith("postgres"):
+    make_psycopg2_green()
+
+engine = create_engine(DATABASE_URL, **engine_options)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+
+# -------------------------------------------------
+# COLD-START AWARE CONNECTION RETRY
+# -------------------------------------------------
+@event.listens_for(engine, "do_connect")
+def connect_with_retry(dialect, conn_rec, cargs, cparams):
+    """Retry new DBAPI connections with exponential backoff.
+
+    Every session acquisition that needs a fresh connection goes through
+    here, so requests arriving while the database is waking up wait for it
+    instead of failing on the first refused connection.
+    """
+    global connect_retries
+    delay = DB_RETRY_BACKOFF
+    for attempt in range(1, DB_CONNECT_RETRIES + 1):
+        try:
+            return dialect.connect(*cargs, **cparams)
+        except dialect.loaded_dbapi.OperationalError as e:
+            if attempt == DB_CONNECT_RETRIES:
+                raise
+            connect_retries += 1
+            print(f"[DB] Connect attempt {attempt} failed (database waking up?): {str(e).strip()}; retrying in {delay:.1f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, DB_RETRY_BACKOFF_MAX)
+
+
+# -------------------------------------------------
+# QUERY TIMING (for /metrics)
+# -------------------------------------------------
+db_query_seconds = Histogram("db_query_duration_seconds", "Time spent executing SQL statements")
+Gauge(
+    "db_pool_checked_out",
+    "Pooled connections currently in use",
+    lambda: engine.pool.checkedout() if isinstance(engine.pool, QueuePool) else 0,
+)
+
+if METRICS_ENABLED:
+    @event.listens_for(engine, "before_cursor_execute")
+    def query_started(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def query_finished(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        db_query_seconds.observe(elapsed)
+        add_query_to_tally(elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def query_failed(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
+
+
+def warm_up_pool(connections=DB_WARMUP_CONNECTIONS):
+    """Open `connections` pooled connections up front (and wake the database)."""
+    held = []
+    try:
+        for _ in range(connections):
+            held.append(engine.connect())
+        print(f"[DB] Connection pool warmed up ({len(held)} connections)")
+    except Exception as e:
+        print(f"[DB] Pool warm-up stopped after {len(held)} connections: {e}")
+    finally:
+        for conn in held:
+            conn.close()
+
+
+def pool_stats():
+    pool = engine.pool
+    stats = {
+        "class": type(pool).__name__,
+        "pre_ping": DB_POOL_PRE_PING,
+        "recycle": DB_POOL_RECYCLE,
+        "connect_retries": connect_retries,
+        "timeouts": pool_timeouts,
+        "checkout_wait_seconds": pool_checkout_wait.snapshot(),
+    }
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            max_overflow=DB_MAX_OVERFLOW,
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=pool.overflow(),
+        )
+    return stats
+
+
 # -------------------------------------------------
 # DEBUG LOG
 # -------------------------------------------------
@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+import os
+import threading
+
+from sqlalchemy import select
+
+from db import SessionLocal
+from models import Response, Session, Student
+
+# -------------------------------------------------
+# CONFIGURATION
+# -------------------------------------------------
+# rows fetched per server-side cursor round trip, and rows per written chunk
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "1000"))
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+# each running export holds one pooled DB connection until its download
+# finishes, so a slow client keeps it for as long as it reads; cap them well
+# below DB_POOL_SIZE so submissions always find a connection
+EXPORT_MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", "2"))
+EXPORT_RETRY_AFTER = int(os.getenv("EXPORT_RETRY_AFTER", "10"))
+
+EXPORT_COLUMNS = ("session_code", "submitted_at", "word", "normalized", "student_name", "file_number")
+
+
+def _export_query():
+    # names and file numbers come from the join, not per-row relationship loads
+    return (
+        select(
+            Session.code.label("session_code"),
+            Response.submitted_at,
+            Response.word,
+            Response.normalized,
+            Student.full_name.label("student_name"),
+            Student.file_number,
+        )
+        .select_from(Response)
+        .join(Session, Session.id == Response.session_id)
+        .outerjoin(Student, Student.id == Response.student_id)
+    )
+
+
+def session_export_query(session_id):
+    return _export_query().where(Response.session_id == session_id).order_by(Response.id)
+
+
+def class_export_query(class_id):
+    return _export_query().where(Session.class_id == class_id).order_by(Session.id, Response.id)
+
+
+# -------------------------------------------------
+# CONCURRENCY
+# -------------------------------------------------
+_export_slots = threading.BoundedSemaphore(EXPORT_MAX_CONCURRENT)
+
+
+def acquire_export_slot():
+    """Reserve one of the EXPORT_MAX_CONCURRENT slots without waiting; False if none is free."""
+    return _export_slots.acquire(blocking=False)
+
+
+def release_export_slot():
+    _export_slots.release()
+
+
+# -------------------------------------------------
+# STREAMING WRITERS
+# -------------------------------------------------
+# spreadsheet apps run cells that start with these as formulas
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_cell(value):
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_export(query, fmt):
+    """Yield the rows of `query` as CSV or NDJSON text, one chunk per fetch.
+
+    Opens its own DB session (the view's is closed before the body is sent)
+    and reads through a server-side cursor, so memory stays flat however
+    many responses are exported. The connection is held until the last
+    chunk is sent; callers bound this with acquire_export_slot().
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(query.execution_options(yield_per=EXPORT_FETCH_SIZE))
+        buf = io.StringIO()
+        writer = csv.writer(buf) if fmt == "csv" else None
+        if writer:
+            writer.writerow(EXPORT_COLUMNS)
+        for rows in result.partitions():
+            for row in rows:
+                values = dict(zip(EXPORT_COLUMNS, row))
+                if values["submitted_at"] is not None:
+                    values["submitted_at"] = values["submitted_at"].isoformat()
+                if writer:
+                    writer.writerow([_csv_cell(v) for v in values.values()])
+                else:
+                    buf.write(json.dumps(values, ensure_ascii=False))
+                    buf.write("\n")
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        if writer and buf.tell():
+            yield buf.getvalue()  # header only
+    finally:
+        db.close()
@@ -1,13 +1,30 @@
-from flask import Flask, jsonify
+# gevent has to patch the standard library before anything else imports it
+import serving
+serving.monkey_patch()
+
+from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
 from dotenv import load_dotenv
-from sockets import socketio
-from db import Base, engine
+from sockets import socketio, coalescer, connection_gate
+from migrations import ensure_schema
+from db import engine, warm_up_pool, pool_stats
 from routes.teacher import teacher_bp
 from routes.student import student_bp
-# Import models so they register with Base.metadata before create_all()
-from models import Teacher, Classroom, Student, Session, Response
+from cache import session_cache, token_cache
+from aggregates import cloud_aggregator
+from session_state import session_states
+from writer import response_writer
+from utils import hashing_stats
+from slides import slide_store
+from shared import bus, message_queue_options
+from ratelimit import submit_limiter
+from normalize import normalize_stats
+from metrics import render_prometheus
+from observability import instrument_app, instrument_socketio
+from query_budget import QUERY_PROFILING, query_profiler
+import hmac
 import os
+from functools import wraps
 
 # -------------------------------------------------
 # LOAD ENVIRONMENT VARIABLES
@@ -53,101 +70,27 @@ CORS(
 # -------------------------------------------------
 # SOCKET.IO INITIALIZATION
 # -------------------------------------------------
-socketio.init_app(app, cors_allowed_origins="*")
+# SOCKETIO_MESSAGE_QUEUE relays emits between workers (see serve.py)
+socketio.init_app(app, cors_allowed_origins="*", **serving.socketio_options(), **message_queue_options())
+# client addresses from X-Forwarded-For when PROXY_HOPS is set
+serving.trust_proxy(app)
+
+# -------------------------------------------------
+# INSTRUMENTATION (/metrics)
+# -------------------------------------------------
+instrument_app(app)
+instrument_socketio(socketio, connection_gate, session_states)
+# dev/test: log (or with QUERY_BUDGET_STRICT, fail) requests over their SQL budget
+if QUERY_PROFILING:
+    query_profiler.install(app, engine)
 
 # -------------------------------------------------
 # DATABASE SETUP
 # -------------------------------------------------
-def migrate_database():
-    """Add missing columns to existing tables"""
-    from sqlalchemy import text, inspect
-    inspector = inspect(engine)
-    
-    # Check if students table exists and if file_number column is missing
-    if 'students' in inspector.get_table_names():
-        columns = [col['name'] for col in inspector.get_columns('students')]
-        if 'file_number' not in columns:
-            print("[DB] Adding file_number column to students table...")
-            try:
-                with engine.begin() as conn:
-                    # Add file_number column (nullable for existing records, but new records will require it)
-                    conn.execute(text("ALTER TABLE students ADD COLUMN file_number VARCHAR(50)"))
-                print("[DB] Successfully added file_number column")
-            except Exception as e:
-                print(f"[DB] Error adding file_number column: {e}")
-                import traceback
-                traceback.print_exc()
-                # Continue anyway - the app might still work if column gets added manually
-    
-    # Check if sessions table exists and if class_id column is missing
-    if 'sessions' in inspector.get_table_names():
-        columns = [col['name'] for col in inspector.get_columns('sessions')]
-        if 'class_id' not in columns:
-            print("[DB] Adding class_id column to sessions table...")
-            try:
-                with engine.begin() as conn:
-                    # Add class_id column (nullable for existing records, but new records will require it)
-                    conn.execute(text("ALTER TABLE sessions ADD COLUMN class_id INTEGER"))
-                    # Add foreign key constraint if it doesn't exist
-                    try:
-                        conn.execute(text("ALTER TABLE sessions ADD CONSTRAINT fk_sessions_class_id FOREIGN KEY (class_id) REFERENCES classes(id) ON DELETE CASCADE"))
-                    except Exception as fk_err:
-                        # Foreign key might already exist or table might not exist yet
-                        print(f"[DB] Note: Could not add foreign key constraint (may already exist): {fk_err}")
-                print("[DB] Successfully added class_id column to sessions table")
-            except Exception as e:
-                print(f"[DB] Error adding class_id column: {e}")
-                import traceback
-                traceback.print_exc()
-                # Continue anyway - the app might still work if column gets added manually
-    
-    # Check if responses table exists and if student_id or session_id columns are missing
-    if 'responses' in inspector.get_table_names():
-        columns = [col['name'] for col in inspector.get_columns('responses')]
-        
-        if 'student_id' not in columns:
-            print("[DB] Adding student_id column to responses table...")
-            try:
-                with engine.begin() as conn:
-                    conn.execute(text("ALTER TABLE responses ADD COLUMN student_id INTEGER"))
-                    try:
-                        conn.execute(text("ALTER TABLE responses ADD CONSTRAINT fk_responses_student_id FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE"))
-                    except Exception as fk_err:
-                        print(f"[DB] Note: Could not add student_id foreign key constraint (may already exist): {fk_err}")
-                print("[DB] Successfully added student_id column to responses table")
-            except Exception as e:
-                print(f"[DB] Error adding student_id column: {e}")
-                import traceback
-                traceback.print_exc()
-        
-        if 'session_id' not in columns:
-            print("[DB] Adding session_id column to responses table...")
-            try:
-                with engine.begin() as conn:
-                    conn.execute(text("ALTER TABLE responses ADD COLUMN session_id INTEGER"))
-                    try:
-                        conn.execute(text("ALTER TABLE responses ADD CONSTRAINT fk_responses_session_id FOREIGN KEY (session_id) REFERENCES sessions(id) ON DELETE CASCADE"))
-                    except Exception as fk_err:
-                        print(f"[DB] Note: Could not add session_id foreign key constraint (may already exist): {fk_err}")
-                print("[DB] Successfully added session_id column to responses table")
-            except Exception as e:
-                print(f"[DB] Error adding session_id column: {e}")
-                import traceback
-                traceback.print_exc()
-
-try:
-    Base.metadata.create_all(bind=engine)
-    # Run migrations
-    migrate_database()
-    # List all tables that were created/verified
-    from sqlalchemy import inspect
-    inspector = inspect(engine)
-    tables = inspector.get_table_names()
-    print(f"[DB] Tables ensured successfully: {', '.join(tables)}")
-except Exception as e:
-    print(f"[DB] Error creating tables: {e}")
-    import traceback
-    traceback.print_exc()
+# Versioned migrations: a single version query on warm starts
+ensure_schema()
+# Open the pool now so the first class-wide burst doesn't pay for connects
+warm_up_pool()
 
 # -------------------------------------------------
 # BLUEPRINT REGISTRATION
@@ -176,6 +119,74 @@ def health():
         "allowed_origins": ALLOWED_ORIGINS,
     }), 200
 
+# -------------------------------------------------
+# OPERATOR ENDPOINTS (/stats, /metrics)
+# -------------------------------------------------
+# With OPS_TOKEN set, /stats and /metrics need "Authorization: Bearer <token>".
+# Without it they only answer direct loopback requests (not ones relayed by
+# a proxy), so they are never public on the app port by default.
+OPS_TOKEN = os.getenv("OPS_TOKEN", "")
+
+
+def require_ops_access(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        if OPS_TOKEN:
+            supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+            allowed = hmac.compare_digest(supplied.encode(), OPS_TOKEN.encode())
+        else:
+            allowed = (
+                request.remote_addr in ("127.0.0.1", "::1")
+                and "X-Forwarded-For" not in request.headers
+                and "Forwarded" not in request.headers
+            )
+        if not allowed:
+            return jsonify({"success": False, "error": "not found"}), 404
+        return f(*args, **kwargs)
+    return wrapper
+
+
+# -------------------------------------------------
+# RUNTIME STATS (cache sizing, etc.)
+# -------------------------------------------------
+@app.get("/stats")
+@require_ops_access
+def stats():
+    return jsonify({
+        "session_cache": session_cache.stats(),
+        "token_cache": token_cache.stats(),
+        "cloud_cache": cloud_aggregator.stats(),
+        "response_writer": response_writer.stats(),
+        "socket_coalescer": coalescer.stats(),
+        "socket_connections": connection_gate.stats(),
+        "password_hashing": hashing_stats(),
+        "db_pool": pool_stats(),
+        "slides": slide_store.stats(),
+        "shared": bus.stats(),
+        "rate_limits": submit_limiter.stats(),
+        "word_normalization": normalize_stats(),
+        "query_budget": query_profiler.stats() if QUERY_PROFILING else None,
+    }), 200
+
+# -------------------------------------------------
+# PROMETHEUS METRICS
+# -------------------------------------------------
+@app.get("/metrics")
+@require_ops_access
+def metrics():
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+# -------------------------------------------------
+# GRACEFUL SHUTDOWN
+# -------------------------------------------------
+def graceful_shutdown():
+    """Refuse new sockets, commit queued words, push pending deltas, then drain rooms."""
+    print("[SERVER] Shutting down: flushing pending writes and draining sockets")
+    connection_gate.close()
+    response_writer.stop()
+    coalescer.flush()
+    connection_gate.drain()
+
 # -------------------------------------------------
 # MAIN ENTRY POINT
 # -------------------------------------------------
@@ -189,8 +200,8 @@ if __name__ == "__main__":
     print(f"Database URL: {os.getenv('DATABASE_URL', 'not set')}")
     print(f"JWT Secret: {'set' if os.getenv('JWT_SECRET') else 'missing!'}")
     print(f"Allowed Frontend Origins: {ALLOWED_ORIGINS}")
+    print(f"Async mode: {serving.SOCKETIO_ASYNC_MODE}")
     print(f"Running on http://0.0.0.0:{port}")
     print("==========================================\n")
 
-    # Allow Werkzeug for Render
-    socketio.run(app, host="0.0.0.0", port=port, allow_unsafe_werkzeug=True)
+    serving.run(app, socketio, "0.0.0.0", port, on_shutdown=graceful_shutdown)
@@ -0,0 +1,187 @@
+import bisect
+import os
+import threading
+
+# -------------------------------------------------
+# CONFIGURATION
+# -------------------------------------------------
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# every metric created below registers itself here for /metrics
+REGISTRY = []
+
+
+def _labels_text(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# -------------------------------------------------
+# LATENCY HISTOGRAMS
+# -------------------------------------------------
+# Upper bounds in seconds; the last bucket is +Inf.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative histogram of observed durations (seconds).
+
+    With `labelnames`, observations go to per-label children: `h.labels("GET", "/x").observe(t)`.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, description="", buckets=DEFAULT_BUCKETS, labelnames=(), register=True):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+        if register:
+            REGISTRY.append(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(
+                    values, Histogram(self.name, buckets=self.buckets, register=False)
+                )
+        return child
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative, running = {}, 0
+        for bound, n in zip(self.buckets + ("+Inf",), counts):
+            running += n
+            cumulative[str(bound)] = running
+        return {
+            "count": count,
+            "sum": round(total, 6),
+            "avg": round(total / count, 6) if count else 0.0,
+            "buckets": cumulative,
+        }
+
+    def samples(self):
+        series = list(self._children.items()) if self.labelnames else [((), self)]
+        for values, child in series:
+            snap = child.snapshot()
+            for bound, n in snap["buckets"].items():
+                yield f"{self.name}_bucket{_labels_text(self.labelnames, values, ('le', bound))} {n}"
+            labels = _labels_text(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {snap['sum']}"
+            yield f"{self.name}_count{labels} {snap['count']}"
+
+
+# -------------------------------------------------
+# COUNTERS + GAUGES
+# -------------------------------------------------
+class Counter:
+    """Monotonic count, optionally per label values: `c.inc("cloud_delta", amount=120)`."""
+
+    kind = "counter"
+
+    def __init__(self, name, description="", labelnames=(), register=True):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        if register:
+            REGISTRY.append(self)
+
+    def inc(self, *values, amount=1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def value(self, *values):
+        return self._values.get(values, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for values, n in items:
+            yield f"{self.name}{_labels_text(self.labelnames, values)} {_number(n)}"
+
+
+class Gauge:
+    """Value read when scraped: `fn()` returns a number, or {label values tuple: number}."""
+
+    kind = "gauge"
+
+    def __init__(self, name, description, fn, labelnames=(), register=True):
+        self.name = name
+        self.description = description
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+        if register:
+            REGISTRY.append(self)
+
+    def samples(self):
+        value = self.fn()
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for values, n in items:
+            yield f"{self.name}{_labels_text(self.labelnames, values)} {_number(n)}"
+
+
+def render_prometheus():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.description}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        try:
+            lines.extend(metric.samples())
+        except Exception as e:
+            print(f"[METRICS] Could not collect {metric.name}:", e)
+    return "\n".join(lines) + "\n"
+
+
+# -------------------------------------------------
+# PER-REQUEST DB ACCOUNTING
+# -------------------------------------------------
+# before_request starts a tally; engine events add to it (see db.py)
+_request_tally = threading.local()
+
+
+def start_request_tally():
+    _request_tally.queries = 0
+    _request_tally.seconds = 0.0
+
+
+def add_query_to_tally(seconds):
+    if getattr(_request_tally, "queries", None) is not None:
+        _request_tally.queries += 1
+        _request_tally.seconds += seconds
+
+
+def finish_request_tally():
+    """(queries, seconds) since start_request_tally(), or None outside a request."""
+    queries = getattr(_request_tally, "queries", None)
+    if queries is None:
+        return None
+    seconds = _request_tally.seconds
+    _request_tally.queries = None
+    return queries, seconds
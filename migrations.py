@@ -0,0 +1,270 @@
+"""Versioned schema migrations.
+
+Applied steps are recorded in a `schema_version` table, so a warm start
+costs a single `SELECT MAX(version)`. Run once per deploy with:
+
+    python migrations.py upgrade      # apply pending steps
+    python migrations.py current      # print the database version
+    python migrations.py check        # exit 1 if steps are pending
+    python migrations.py renormalize  # re-key stored words after changing
+                                      # WORD_STEMMING / WORD_STOPWORDS
+
+and set MIGRATE_ON_STARTUP=false so web workers only verify the version.
+"""
+import os
+import sys
+import traceback
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    func,
+    inspect,
+    select,
+    text,
+)
+
+from db import Base, engine
+# Import models so they register with Base.metadata before create_all()
+import models  # noqa: F401
+from normalize import NORMALIZED_MAX, Stopword, normalize_word
+
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+_version_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    _version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+# -------------------------------------------------
+# HELPERS
+# -------------------------------------------------
+def _add_column_if_missing(conn, table, column, ddl, foreign_key=None):
+    """Older databases predate some columns; add them if they are missing."""
+    inspector = inspect(conn)
+    if table not in inspector.get_table_names():
+        return
+    if column in [c["name"] for c in inspector.get_columns(table)]:
+        return
+    print(f"[DB] Adding {column} column to {table} table...")
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    if foreign_key and conn.dialect.name != "sqlite":
+        try:
+            with conn.begin_nested():
+                conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {foreign_key}"))
+        except Exception as fk_err:
+            print(f"[DB] Note: Could not add foreign key constraint (may already exist): {fk_err}")
+
+
+def _create_index(conn, name, statement):
+    try:
+        with conn.begin_nested():
+            conn.execute(text(statement))
+    except Exception as e:
+        # e.g. duplicate file numbers already present in a class
+        print(f"[DB] Could not create index {name}: {e}")
+
+
+# -------------------------------------------------
+# MIGRATION STEPS (append only, never renumber)
+# -------------------------------------------------
+def _create_tables(conn):
+    Base.metadata.create_all(bind=conn)
+
+
+def _legacy_columns(conn):
+    # nullable for existing records, but new records will require them
+    _add_column_if_missing(conn, "students", "file_number", "VARCHAR(50)")
+    _add_column_if_missing(
+        conn, "sessions", "class_id", "INTEGER",
+        "fk_sessions_class_id FOREIGN KEY (class_id) REFERENCES classes(id) ON DELETE CASCADE",
+    )
+    _add_column_if_missing(
+        conn, "responses", "student_id", "INTEGER",
+        "fk_responses_student_id FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE",
+    )
+    _add_column_if_missing(
+        conn, "responses", "session_id", "INTEGER",
+        "fk_responses_session_id FOREIGN KEY (session_id) REFERENCES sessions(id) ON DELETE CASCADE",
+    )
+
+
+def _hot_lookup_indexes(conn):
+    _create_index(conn, "uq_students_class_file",
+                  "CREATE UNIQUE INDEX IF NOT EXISTS uq_students_class_file ON students (class_id, file_number)")
+    _create_index(conn, "ix_responses_session_student",
+                  "CREATE INDEX IF NOT EXISTS ix_responses_session_student ON responses (session_id, student_id)")
+    _create_index(conn, "ix_sessions_class_id",
+                  "CREATE INDEX IF NOT EXISTS ix_sessions_class_id ON sessions (class_id)")
+
+
+def _submission_counters(conn):
+    models.SubmissionCounter.__table__.create(bind=conn, checkfirst=True)
+    # seed counters from what has already been submitted
+    conn.execute(text(
+        "INSERT INTO submission_counters (session_id, student_id, count) "
+        "SELECT session_id, student_id, COUNT(*) FROM responses "
+        "WHERE session_id IS NOT NULL AND student_id IS NOT NULL "
+        "AND NOT EXISTS (SELECT 1 FROM submission_counters c "
+        "WHERE c.session_id = responses.session_id AND c.student_id = responses.student_id) "
+        "GROUP BY session_id, student_id"
+    ))
+
+
+def _slides(conn):
+    models.Slide.__table__.create(bind=conn, checkfirst=True)
+    _add_column_if_missing(conn, "sessions", "slide_hash", "VARCHAR(64)")
+
+
+def _session_summaries(conn):
+    # filled in at end-session, or lazily when a class's history is read
+    models.SessionSummary.__table__.create(bind=conn, checkfirst=True)
+
+
+def _normalize_responses(conn, only_missing=True):
+    """Set responses.normalized from the current pipeline settings, in id order, a batch at a time."""
+    missing = "normalized IS NULL AND " if only_missing else ""
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            text(f"SELECT id, word FROM responses WHERE {missing}id > :last ORDER BY id LIMIT 5000"),
+            {"last": last_id},
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            try:
+                key = normalize_word(row.word)
+            except Stopword:
+                key = row.word.casefold()[:NORMALIZED_MAX]  # already counted; keep it rather than drop it
+            updates.append({"id": row.id, "key": key})
+        conn.execute(text("UPDATE responses SET normalized = :key WHERE id = :id"), updates)
+        last_id = rows[-1].id
+    # rollups grouped on the old keys; the history view rebuilds them lazily
+    conn.execute(text("DELETE FROM session_summaries"))
+
+
+def _normalized_words(conn):
+    _add_column_if_missing(conn, "responses", "normalized", "VARCHAR(50)")
+    _normalize_responses(conn)
+    _create_index(conn, "ix_responses_session_normalized",
+                  "CREATE INDEX IF NOT EXISTS ix_responses_session_normalized ON responses (session_id, normalized)")
+
+
+def _session_roster_size(conn):
+    _add_column_if_missing(conn, "sessions", "roster_size", "INTEGER")
+    # existing rollups recorded the roster size of their time; keep it
+    conn.execute(text(
+        "UPDATE sessions SET roster_size = (SELECT roster_size FROM session_summaries "
+        "WHERE session_summaries.session_id = sessions.id) WHERE roster_size IS NULL"
+    ))
+
+
+MIGRATIONS = [
+    (1, "create tables", _create_tables),
+    (2, "legacy columns", _legacy_columns),
+    (3, "hot lookup indexes", _hot_lookup_indexes),
+    (4, "submission counters", _submission_counters),
+    (5, "slide store", _slides),
+    (6, "session summaries", _session_summaries),
+    (7, "normalized words", _normalized_words),
+    (8, "session roster size", _session_roster_size),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# -------------------------------------------------
+# RUNNER
+# -------------------------------------------------
+def current_version(bind=engine):
+    """Applied schema version, or 0 if the version table does not exist yet."""
+    try:
+        with bind.connect() as conn:
+            return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+    except Exception:
+        return 0
+
+
+def upgrade(bind=engine):
+    """Apply pending steps in one transaction (a savepoint per step). Returns the new version."""
+    with bind.begin() as conn:
+        _version_metadata.create_all(bind=conn)
+        if conn.dialect.name == "postgresql":
+            # serialize concurrent deploys/workers; released at commit
+            conn.execute(text("SELECT pg_advisory_xact_lock(824173)"))
+        version = conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+        for step, name, apply in MIGRATIONS:
+            if step <= version:
+                continue
+            print(f"[DB] Applying migration {step}: {name}")
+            with conn.begin_nested():
+                apply(conn)
+                conn.execute(schema_version.insert().values(version=step, name=name))
+            version = step
+    return version
+
+
+def ensure_schema(bind=engine):
+    """Startup hook: one query when current, otherwise upgrade (or warn)."""
+    version = current_version(bind)
+    if version >= LATEST_VERSION:
+        print(f"[DB] Schema is current (version {version})")
+        return version
+    if not MIGRATE_ON_STARTUP:
+        print(f"[DB] WARNING: schema version {version} < {LATEST_VERSION}; run `python migrations.py upgrade`")
+        return version
+    try:
+        version = upgrade(bind)
+        print(f"[DB] Schema upgraded to version {version}")
+    except Exception as e:
+        print(f"[DB] Error running migrations: {e}")
+        traceback.print_exc()
+    return version
+
+
+def renormalize(bind=engine):
+    """Recompute every stored key, e.g. after changing WORD_STEMMING or WORD_STOPWORDS.
+
+    Restart the workers afterwards so their in-memory clouds are rebuilt on the new keys.
+    """
+    with bind.begin() as conn:
+        _normalize_responses(conn, only_missing=False)
+
+
+# -------------------------------------------------
+# CLI
+# -------------------------------------------------
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "upgrade"
+    if command == "upgrade":
+        print(f"[DB] Schema at version {upgrade()}")
+        return 0
+    if command == "current":
+        print(current_version())
+        return 0
+    if command == "check":
+        version = current_version()
+        print(f"[DB] Schema version {version}, latest {LATEST_VERSION}")
+        return 0 if version >= LATEST_VERSION else 1
+    if command == "renormalize":
+        renormalize()
+        print("[DB] Stored words re-normalized; restart the workers")
+        return 0
+    print("usage: python migrations.py [upgrade|current|check|renormalize]")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,10 @@ from sqlalchemy import (
     ForeignKey,
     DateTime,
     Boolean,
+    Index,
+    LargeBinary,
+    Text,
+    UniqueConstraint,
     func,
 )
 from sqlalchemy.orm import relationship
@@ -61,6 +65,12 @@ class Student(Base):
     classroom = relationship("Classroom", back_populates="students")
     responses = relationship("Response", back_populates="student", cascade="all, delete-orphan")
 
+    # one file number per class; also serves (class_id, file_number) and
+    # class_id-only roster lookups
+    __table_args__ = (
+        UniqueConstraint("class_id", "file_number", name="uq_students_class_file"),
+    )
+
     def __repr__(self):
         return f"<Student(id={self.id}, name='{self.full_name}', file_number='{self.file_number}')>"
 
@@ -77,12 +87,18 @@ class Session(Base):
     word_limit = Column(Integer, default=3)
     start_time = Column(DateTime(timezone=True))
     end_time = Column(DateTime(timezone=True))
+    slide_hash = Column(String(64))  # current slide, see Slide
+    roster_size = Column(Integer)  # class size when the session ended, see SessionSummary
 
     class_id = Column(Integer, ForeignKey("classes.id", ondelete="CASCADE"))
 
     classroom = relationship("Classroom", back_populates="sessions")
     responses = relationship("Response", back_populates="session", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_sessions_class_id", "class_id"),
+    )
+
     def __repr__(self):
         return f"<Session(code='{self.code}', active={self.is_active})>"
 
@@ -95,6 +111,7 @@ class Response(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     word = Column(String(50), nullable=False)
+    normalized = Column(String(50))  # canonical key the cloud groups on (see normalize.py)
     submitted_at = Column(DateTime(timezone=True), server_default=func.now())
 
     student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"))
@@ -103,5 +120,72 @@ class Response(Base):
     student = relationship("Student", back_populates="responses")
     session = relationship("Session", back_populates="responses")
 
+    # per-student word limit checks and per-session cloud aggregation
+    __table_args__ = (
+        Index("ix_responses_session_student", "session_id", "student_id"),
+        Index("ix_responses_session_normalized", "session_id", "normalized"),
+    )
+
     def __repr__(self):
         return f"<Response(student_id={self.student_id}, word='{self.word}')>"
+
+
+# -------------------------------------------------
+# SUBMISSION COUNTER MODEL
+# -------------------------------------------------
+class SubmissionCounter(Base):
+    """Words submitted per (session, student); enforces Session.word_limit."""
+    __tablename__ = "submission_counters"
+
+    session_id = Column(Integer, ForeignKey("sessions.id", ondelete="CASCADE"), primary_key=True)
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<SubmissionCounter(session_id={self.session_id}, student_id={self.student_id}, count={self.count})>"
+
+
+# -------------------------------------------------
+# SLIDE MODEL (content-addressed slide images)
+# -------------------------------------------------
+class Slide(Base):
+    __tablename__ = "slides"
+
+    hash = Column(String(64), primary_key=True)  # sha256 of data
+    content_type = Column(String(100), nullable=False)
+    size = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<Slide(hash='{self.hash[:12]}', size={self.size})>"
+
+
+# -------------------------------------------------
+# SESSION SUMMARY MODEL (rollup of an ended session)
+# -------------------------------------------------
+class SessionSummary(Base):
+    """Word counts and participation for an ended session, computed once (see summaries.py)."""
+    __tablename__ = "session_summaries"
+
+    session_id = Column(Integer, ForeignKey("sessions.id", ondelete="CASCADE"), primary_key=True)
+    class_id = Column(Integer, ForeignKey("classes.id", ondelete="CASCADE"), nullable=False)
+    code = Column(String(10), nullable=False)
+    started_at = Column(DateTime(timezone=True))
+    ended_at = Column(DateTime(timezone=True))
+    total_responses = Column(Integer, nullable=False, default=0)
+    distinct_words = Column(Integer, nullable=False, default=0)
+    participants = Column(Integer, nullable=False, default=0)  # students who submitted
+    roster_size = Column(Integer, nullable=False, default=0)
+    first_submission_at = Column(DateTime(timezone=True))
+    last_submission_at = Column(DateTime(timezone=True))
+    words = Column(Text, nullable=False, default="[]")  # JSON [[word, count, students], ...], most frequent first
+    computed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # class history pages: WHERE class_id = ? AND session_id < ? ORDER BY session_id DESC
+    __table_args__ = (
+        Index("ix_session_summaries_class_session", "class_id", "session_id"),
+    )
+
+    def __repr__(self):
+        return f"<SessionSummary(session_id={self.session_id}, responses={self.total_responses})>"
@@ -0,0 +1,115 @@
+import os
+import sys
+import unicodedata
+from functools import lru_cache
+
+from models import Response
+
+# -------------------------------------------------
+# CONFIGURATION
+# -------------------------------------------------
+# keys are stored with each response; after changing any of these, run
+# `python migrations.py renormalize` so old and new keys don't split a cloud
+WORD_NORMALIZATION = os.getenv("WORD_NORMALIZATION", "true").lower() in ("1", "true", "yes")
+# fold English plurals ("cells" -> "cell"); off by default
+WORD_STEMMING = os.getenv("WORD_STEMMING", "false").lower() in ("1", "true", "yes")
+# comma-separated languages whose stopwords are dropped, e.g. "en,fr"
+WORD_STOPWORDS = [lang.strip() for lang in os.getenv("WORD_STOPWORDS", "").split(",") if lang.strip()]
+WORD_NORMALIZE_CACHE = int(os.getenv("WORD_NORMALIZE_CACHE", "65536"))
+
+NORMALIZED_MAX = Response.__table__.c.normalized.type.length
+
+# written with their accents: the pipeline folds case but keeps diacritics,
+# so "más" and "mas" are different words (both are listed where both are common)
+STOPWORDS = {
+    "en": "a an and are as at be but by for from has have he her his i in is it its of on or she so that the "
+          "their them they this to was we were what when which who will with you your",
+    "fr": "à au aux avec ce ces dans de des du elle en et eux il ils je la le les leur lui ma mais me mes moi mon "
+          "ne nous on ou où par pas pour qu que qui sa se ses son sur ta te tes toi ton tu un une vos votre vous",
+    "es": "a al con de del el él ella ellos en es esta está este la las le les lo los mas más me mi mí no nos o "
+          "para pero por que qué se si sí su sus te tu tú un una uno y ya yo",
+    "de": "aber als am an auch auf aus bei das dass dem den der des die du ein eine einem einen einer er es für "
+          "ich ihr im in ist ja mit nicht noch oder sie sind so und uns von was wie wir zu",
+}
+
+
+class Stopword(ValueError):
+    pass
+
+
+# -------------------------------------------------
+# LOOKUP TABLES (built once at import)
+# -------------------------------------------------
+def _punctuation_table():
+    # every BMP punctuation character becomes a space, except apostrophes,
+    # which are dropped so "don't" and "dont" meet
+    table = {
+        cp: " "
+        for cp in range(min(sys.maxunicode, 0xFFFF) + 1)
+        if unicodedata.category(chr(cp)).startswith("P")
+    }
+    for apostrophe in "'’ʼ":
+        table[ord(apostrophe)] = None
+    return table
+
+
+_PUNCTUATION = _punctuation_table()
+_STOPWORDS = frozenset(
+    unicodedata.normalize("NFKC", word).casefold()
+    for lang in WORD_STOPWORDS
+    for word in STOPWORDS.get(lang, "").split()
+)
+_KEEP_S = ("ss", "us", "is")
+
+
+def _stem(token):
+    """Light English plural folding; leaves short and Latin-looking words alone."""
+    if len(token) <= 3 or not token.isalpha():
+        return token
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    if token.endswith(("sses", "shes", "ches", "xes")):
+        return token[:-2]
+    if token.endswith("s") and not token.endswith(_KEEP_S):
+        return token[:-1]
+    return token
+
+
+# -------------------------------------------------
+# PIPELINE
+# -------------------------------------------------
+@lru_cache(maxsize=WORD_NORMALIZE_CACHE)
+def normalize_word(word):
+    """Canonical key for a submitted word: what the cloud groups on.
+
+    NFKC, case folding, punctuation and whitespace collapsed to single
+    spaces, then optional plural folding and stopword removal. Raises
+    Stopword if nothing but stopwords is left.
+    """
+    if not WORD_NORMALIZATION:
+        return word[:NORMALIZED_MAX]
+    folded = unicodedata.normalize("NFKC", word).casefold()
+    tokens = folded.translate(_PUNCTUATION).split()
+    if not tokens:
+        # nothing but punctuation ("?!"): keep it as typed
+        return " ".join(folded.split())[:NORMALIZED_MAX]
+    if _STOPWORDS:
+        tokens = [t for t in tokens if t not in _STOPWORDS]
+        if not tokens:
+            raise Stopword(word)
+    if WORD_STEMMING:
+        tokens = [_stem(t) for t in tokens]
+    return " ".join(tokens)[:NORMALIZED_MAX]
+
+
+def normalize_stats():
+    info = normalize_word.cache_info()
+    return {
+        "enabled": WORD_NORMALIZATION,
+        "stemming": WORD_STEMMING,
+        "stopwords": WORD_STOPWORDS,
+        "cache_hits": info.hits,
+        "cache_misses": info.misses,
+        "cache_size": info.currsize,
+        "cache_maxsize": info.maxsize,
+    }
@@ -0,0 +1,125 @@
+import time
+
+from engineio.packet import MESSAGE
+from flask import request
+
+from metrics import (
+    METRICS_ENABLED,
+    Counter,
+    Gauge,
+    Histogram,
+    finish_request_tally,
+    start_request_tally,
+)
+
+# -------------------------------------------------
+# HTTP + SOCKET.IO INSTRUMENTATION
+# -------------------------------------------------
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 13, 21, 50)
+
+request_seconds = Histogram(
+    "http_request_duration_seconds", "Request latency by route", labelnames=("method", "route", "status")
+)
+request_db_queries = Histogram(
+    "http_request_db_queries", "SQL statements per request", buckets=QUERY_COUNT_BUCKETS,
+    labelnames=("method", "route"),
+)
+request_db_seconds = Histogram(
+    "http_request_db_seconds", "Time spent in SQL per request", labelnames=("method", "route")
+)
+socket_events = Counter(
+    "socketio_events_emitted_total", "Socket.IO packets sent, per recipient", labelnames=("event",)
+)
+socket_bytes = Counter(
+    "socketio_event_bytes_total", "Encoded Socket.IO payload bytes sent, per recipient", labelnames=("event",)
+)
+
+
+def _route():
+    # the URL rule ("/api/teacher/classes/<int:class_id>"), not the raw path,
+    # so label cardinality stays bounded
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def instrument_app(app):
+    """Time every request and tally its SQL statements."""
+    if not METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def start_timer():
+        request.environ["metrics.start"] = time.perf_counter()
+        start_request_tally()
+
+    @app.after_request
+    def record_request(response):
+        start = request.environ.get("metrics.start")
+        if start is not None:
+            method, route = request.method, _route()
+            request_seconds.labels(method, route, str(response.status_code)).observe(time.perf_counter() - start)
+            tally = finish_request_tally()
+            if tally is not None:
+                request_db_queries.labels(method, route).observe(tally[0])
+                request_db_seconds.labels(method, route).observe(tally[1])
+        return response
+
+
+def _event_name(packet):
+    """Event name of an encoded Socket.IO packet ('2["cloud_delta",{...}]' -> 'cloud_delta')."""
+    if isinstance(packet, bytes):
+        return "binary"
+    kind = packet[:1]
+    if kind in ("2", "5"):
+        start = packet.find('["', 0, 64)
+        end = packet.find('"', start + 2, start + 66) if start != -1 else -1
+        return packet[start + 2:end] if end != -1 else "event"
+    if kind in ("3", "6"):
+        return "ack"
+    return {"0": "connect", "1": "disconnect", "4": "connect_error"}.get(kind, "other")
+
+
+def instrument_socketio(socketio, connection_gate, session_states):
+    """Count packets and bytes sent to clients, and expose connection and room gauges."""
+    Gauge("socketio_connected_clients", "Connected Socket.IO clients",
+          lambda: connection_gate.stats()["connected"])
+    Gauge("socketio_session_rooms", "Session rooms with at least one client",
+          lambda: len(room_sizes(socketio)))
+    # labelled by session id: room names are live join codes
+    Gauge("socketio_room_members", "Clients joined to each session room",
+          lambda: room_members(socketio, session_states), labelnames=("session_id",))
+    if not METRICS_ENABLED:
+        return
+
+    # room broadcasts encode once and hand the same engine.io packet to
+    # send_packet per recipient, so count there rather than in emit()
+    eio = socketio.server.eio
+    send_packet = eio.send_packet
+
+    def counted_send_packet(sid, pkt):
+        if pkt.packet_type == MESSAGE:
+            event = _event_name(pkt.data)
+            socket_events.inc(event)
+            socket_bytes.inc(event, amount=len(pkt.data))
+        return send_packet(sid, pkt)
+
+    eio.send_packet = counted_send_packet
+
+
+def room_sizes(socketio):
+    """{room: member count} of the session rooms (each client's own sid room is skipped)."""
+    rooms = socketio.server.manager.rooms.get("/", {})
+    return {
+        room: len(members)
+        for room, members in list(rooms.items())
+        if room is not None and room not in members
+    }
+
+
+def room_members(socketio, session_states):
+    """{(session id,): members}; rooms joined with a code no session has count as "unknown"."""
+    members = {}
+    for code, n in room_sizes(socketio).items():
+        state = session_states.get(code)
+        key = (str(state.session_id) if state else "unknown",)
+        members[key] = members.get(key, 0) + n
+    return members
@@ -0,0 +1,89 @@
+import os
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+# -------------------------------------------------
+# CONFIGURATION (development / tests only)
+# -------------------------------------------------
+QUERY_PROFILING = os.getenv("QUERY_PROFILING", "false").lower() in ("1", "true", "yes")
+# statements a request may issue unless its view sets its own budget
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "6"))
+# raise instead of logging, so a test client request fails on a regression
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "false").lower() in ("1", "true", "yes")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(limit):
+    """Give a view its own statement budget (None: unbounded)."""
+    def decorator(f):
+        f.query_budget = limit
+        return f
+    return decorator
+
+
+# -------------------------------------------------
+# PER-REQUEST STATEMENT LOG
+# -------------------------------------------------
+class QueryProfiler:
+    """Counts and times SQL statements per request and checks them against a budget.
+
+    Statements outside a request (response writer, socket handlers) are not counted.
+    """
+
+    def __init__(self, budget=QUERY_BUDGET, strict=QUERY_BUDGET_STRICT):
+        self.budget = budget
+        self.strict = strict
+        self.requests = 0
+        self.over_budget = 0
+
+    def install(self, app, engine):
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+        app.before_request(self._start)
+        app.after_request(self._check)
+
+    def _start(self):
+        g.query_log = []
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and "query_log" in g:
+            conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("profile_started")
+        if started and has_request_context() and "query_log" in g:
+            g.query_log.append((statement, time.perf_counter() - started.pop()))
+
+    def _check(self, response):
+        log = g.pop("query_log", None)
+        if log is None:
+            return response
+        self.requests += 1
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, "query_budget", self.budget)
+        if budget is None or len(log) <= budget:
+            return response
+
+        self.over_budget += 1
+        statement, repeats = Counter(s for s, _ in log).most_common(1)[0]
+        message = (
+            f"{request.method} {request.path} ran {len(log)} statements (budget {budget}) "
+            f"in {sum(t for _, t in log) * 1000:.1f} ms; "
+            f"most repeated ({repeats}x): {' '.join(statement.split())[:200]}"
+        )
+        if self.strict:
+            raise QueryBudgetExceeded(message)
+        print("[QUERY BUDGET]", message)
+        return response
+
+    def stats(self):
+        return {"budget": self.budget, "requests": self.requests, "over_budget": self.over_budget}
+
+
+query_profiler = QueryProfiler()
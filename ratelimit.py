@@ -0,0 +1,186 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from serving import PROXY_HOPS
+
+# -------------------------------------------------
+# CONFIGURATION
+# -------------------------------------------------
+RATE_LIMITING = os.getenv("RATE_LIMITING", "true").lower() in ("1", "true", "yes")
+# per student: a short burst, then a steady trickle
+RATE_LIMIT_STUDENT_BURST = float(os.getenv("RATE_LIMIT_STUDENT_BURST", "10"))
+RATE_LIMIT_STUDENT_PER_SEC = float(os.getenv("RATE_LIMIT_STUDENT_PER_SEC", "2"))
+# per session: sized from class size x word_limit once the roster is known
+# (the whole class spending its quota at once), refilled over the window
+RATE_LIMIT_SESSION_BURST = float(os.getenv("RATE_LIMIT_SESSION_BURST", "500"))
+RATE_LIMIT_SESSION_FACTOR = float(os.getenv("RATE_LIMIT_SESSION_FACTOR", "1.0"))
+RATE_LIMIT_SESSION_WINDOW = float(os.getenv("RATE_LIMIT_SESSION_WINDOW", "10"))
+# per client address: room for a whole class behind one school NAT, but a
+# flood of made-up codes or file numbers still shares one bucket. Off unless
+# PROXY_HOPS is set, since behind an untrusted proxy every student would
+# share the proxy's address; set it to true for direct deployments
+RATE_LIMIT_BY_CLIENT = os.getenv("RATE_LIMIT_BY_CLIENT", "true" if PROXY_HOPS else "false").lower() in ("1", "true", "yes")
+RATE_LIMIT_CLIENT_BURST = float(os.getenv("RATE_LIMIT_CLIENT_BURST", "300"))
+RATE_LIMIT_CLIENT_PER_SEC = float(os.getenv("RATE_LIMIT_CLIENT_PER_SEC", "30"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "20000"))
+
+
+# -------------------------------------------------
+# TOKEN BUCKET
+# -------------------------------------------------
+class TokenBucket:
+    """`capacity` tokens, refilled continuously at `rate` tokens per second."""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, cost=1):
+        """Spend `cost` tokens. Returns 0 on success, else seconds until they are available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        cost = min(cost, self.capacity)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+    def refund(self, cost=1):
+        self.tokens = min(self.capacity, self.tokens + cost)
+
+
+# -------------------------------------------------
+# SUBMISSION LIMITER
+# -------------------------------------------------
+class RateLimited(Exception):
+    def __init__(self, scope, retry_after):
+        super().__init__(f"too many submissions ({scope})")
+        self.scope = scope
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self):
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class SubmitLimiter:
+    """Token buckets per client address, session code and (code, student), checked before any DB work.
+
+    Code and student keys come from the request, so the client bucket is what
+    bounds a client that makes them up. Buckets live in this process only;
+    each worker enforces its own share.
+    """
+
+    def __init__(self, enabled=RATE_LIMITING, by_client=RATE_LIMIT_BY_CLIENT, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.enabled = enabled
+        self.by_client = by_client
+        self.max_keys = max_keys
+        self._clients = OrderedDict()  # remote address -> TokenBucket
+        self._sessions = OrderedDict()  # code -> TokenBucket
+        self._students = OrderedDict()  # (code, student key) -> TokenBucket
+        self._rejections = OrderedDict()  # code -> {"session": n, "student": n}
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = {"client": 0, "session": 0, "student": 0}
+
+    def check(self, code, student_key, cost=1, client=None):
+        """Spend `cost` submissions for this client, student and session or raise RateLimited."""
+        if not self.enabled:
+            return
+        with self._lock:
+            spent = []
+            if client and self.by_client:
+                spent.append(self._bucket(self._clients, client, self._client_bucket))
+                wait = spent[-1].take(cost)
+                if wait:
+                    self._reject(None, "client")
+                    raise RateLimited("client", wait)
+            if code:
+                for scope, bucket in (
+                    ("student", self._bucket(self._students, (code, student_key), self._student_bucket)),
+                    ("session", self._bucket(self._sessions, code, self._session_bucket)),
+                ):
+                    wait = bucket.take(cost)
+                    if wait:
+                        for earlier in spent:
+                            earlier.refund(cost)
+                        self._reject(code, scope)
+                        raise RateLimited(scope, wait)
+                    spent.append(bucket)
+            self.allowed += 1
+
+    def size_session(self, code, class_size, word_limit):
+        """Size the session bucket for a full class spending its whole quota at once."""
+        capacity = max(RATE_LIMIT_SESSION_BURST, class_size * (word_limit or 0) * RATE_LIMIT_SESSION_FACTOR)
+        rate = capacity / RATE_LIMIT_SESSION_WINDOW
+        with self._lock:
+            bucket = self._sessions.get(code)
+            if bucket is None:
+                self._bucket(self._sessions, code, lambda: TokenBucket(capacity, rate))
+            elif bucket.capacity != capacity:
+                # roster or word limit changed; keep what was already spent
+                bucket.tokens = max(0, bucket.tokens + capacity - bucket.capacity)
+                bucket.capacity, bucket.rate = capacity, rate
+
+    def rejections(self, code):
+        """Rejection counts of one session, for its teacher."""
+        with self._lock:
+            return dict(self._rejections.get(code) or {"session": 0, "student": 0})
+
+    def stats(self):
+        # totals only: session codes are join codes and stay out of /stats
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "by_client": self.by_client,
+                "allowed": self.allowed,
+                "clients": len(self._clients),
+                "sessions": len(self._sessions),
+                "students": len(self._students),
+                "rejections": dict(self.rejected),
+                "sessions_with_rejections": len(self._rejections),
+            }
+
+    @staticmethod
+    def _student_bucket():
+        return TokenBucket(RATE_LIMIT_STUDENT_BURST, RATE_LIMIT_STUDENT_PER_SEC)
+
+    @staticmethod
+    def _client_bucket():
+        return TokenBucket(RATE_LIMIT_CLIENT_BURST, RATE_LIMIT_CLIENT_PER_SEC)
+
+    @staticmethod
+    def _session_bucket():
+        return TokenBucket(RATE_LIMIT_SESSION_BURST, RATE_LIMIT_SESSION_BURST / RATE_LIMIT_SESSION_WINDOW)
+
+    def _bucket(self, buckets, key, factory):
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = factory()
+            while len(buckets) > self.max_keys:
+                buckets.popitem(last=False)
+        else:
+            buckets.move_to_end(key)
+        return bucket
+
+    def _reject(self, code, scope):
+        self.rejected[scope] += 1
+        if code is None:
+            return
+        counts = self._rejections.get(code)
+        if counts is None:
+            counts = self._rejections[code] = {"session": 0, "student": 0}
+            while len(self._rejections) > self.max_keys:
+                self._rejections.popitem(last=False)
+        counts[scope] += 1
+
+
+submit_limiter = SubmitLimiter()
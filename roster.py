@@ -0,0 +1,187 @@
+import codecs
+import csv
+import io
+import json
+import os
+
+from sqlalchemy import select
+
+from models import Student
+
+# -------------------------------------------------
+# CONFIGURATION
+# -------------------------------------------------
+ROSTER_IMPORT_MAX_ROWS = int(os.getenv("ROSTER_IMPORT_MAX_ROWS", "10000"))
+# rows per multi-row INSERT
+ROSTER_IMPORT_CHUNK = int(os.getenv("ROSTER_IMPORT_CHUNK", "500"))
+_READ_SIZE = 64 * 1024
+
+FULL_NAME_MAX = Student.__table__.c.full_name.type.length
+FILE_NUMBER_MAX = Student.__table__.c.file_number.type.length
+
+# header spellings accepted for each field
+_FIELDS = {
+    "full_name": "full_name",
+    "name": "full_name",
+    "student_name": "full_name",
+    "file_number": "file_number",
+    "file_no": "file_number",
+    "student_id": "file_number",
+}
+
+
+class InvalidRoster(ValueError):
+    pass
+
+
+class RosterTooLarge(ValueError):
+    pass
+
+
+# -------------------------------------------------
+# STREAMING PARSERS
+# -------------------------------------------------
+def roster_format(content_type, filename=None):
+    """'csv', 'json' or 'ndjson' from the upload's content type or file extension."""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    ext = os.path.splitext(filename or "")[1].lower()
+    if content_type in ("text/csv", "application/csv") or ext == ".csv":
+        return "csv"
+    if content_type in ("application/x-ndjson", "application/jsonl") or ext in (".ndjson", ".jsonl"):
+        return "ndjson"
+    if content_type == "application/json" or ext == ".json":
+        return "json"
+    raise InvalidRoster("upload a CSV, JSON array or NDJSON roster")
+
+
+def iter_roster(stream, fmt):
+    """Yield raw row dicts from a binary stream without reading it all into memory."""
+    if fmt == "csv":
+        reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+        try:
+            yield from reader
+        except (csv.Error, UnicodeDecodeError) as e:
+            raise InvalidRoster(f"invalid CSV on line {reader.line_num}: {e}")
+    elif fmt == "ndjson":
+        for line_num, line in enumerate(io.TextIOWrapper(stream, encoding="utf-8-sig"), start=1):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    raise InvalidRoster(f"invalid JSON on line {line_num}")
+    else:
+        yield from _iter_json_array(stream)
+
+
+def _iter_json_array(stream):
+    """Yield the elements of a top-level JSON array, decoding one element at a time."""
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8-sig")()
+    buf, pos, started = "", 0, False
+    while True:
+        chunk = stream.read(_READ_SIZE)
+        try:
+            buf = buf[pos:] + text.decode(chunk, final=not chunk)
+        except UnicodeDecodeError:
+            raise InvalidRoster("roster is not valid UTF-8")
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buf):
+                break
+            if not started:
+                if buf[pos] != "[":
+                    raise InvalidRoster("expected a JSON array of students")
+                started, pos = True, pos + 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if not chunk:
+                    raise InvalidRoster("invalid JSON")
+                break  # element continues in the next chunk
+            if end == len(buf) and chunk and not isinstance(item, (dict, list)):
+                break  # a scalar may be cut off mid-token
+            yield item
+            pos = end
+        if not chunk:
+            raise InvalidRoster("unterminated JSON array" if started else "empty roster")
+
+
+# -------------------------------------------------
+# NORMALIZATION
+# -------------------------------------------------
+def normalize_row(raw):
+    """(full_name, file_number, error) from a parsed row."""
+    if not isinstance(raw, dict):
+        return None, None, "row is not an object"
+    row = {}
+    for key, value in raw.items():
+        field = _FIELDS.get(str(key).strip().lower().replace(" ", "_").replace("-", "_"))
+        if field and value is not None:
+            row[field] = " ".join(str(value).split())
+    full_name, file_number = row.get("full_name"), row.get("file_number")
+    if not full_name:
+        return full_name, file_number, "student name required"
+    if not file_number:
+        return full_name, file_number, "file number required"
+    if len(full_name) > FULL_NAME_MAX:
+        return full_name, file_number, "student name too long"
+    if len(file_number) > FILE_NUMBER_MAX:
+        return full_name, file_number, "file number too long"
+    return full_name, file_number, None
+
+
+# -------------------------------------------------
+# IMPORT
+# -------------------------------------------------
+def import_roster(db, class_id, rows):
+    """Add the new students among `rows` to a class. Does not commit.
+
+    Existing file numbers are read in one query, duplicates within the
+    upload are dropped in memory and new students are inserted
+    ROSTER_IMPORT_CHUNK rows per statement. Returns (created, results)
+    with one compact result per input row.
+    """
+    existing = set(db.scalars(select(Student.file_number).where(Student.class_id == class_id)))
+    seen = set()
+    results = []
+    pending = []
+    created = 0
+
+    def flush():
+        nonlocal created
+        inserted = db.execute(
+            Student.__table__.insert().returning(Student.id, Student.file_number),
+            [{"full_name": name, "file_number": number, "class_id": class_id} for _, name, number in pending],
+        )
+        ids = dict((number, student_id) for student_id, number in inserted)
+        for index, _, number in pending:
+            results[index]["id"] = ids[number]
+        created += len(pending)
+        pending.clear()
+
+    for row_num, raw in enumerate(rows, start=1):
+        if row_num > ROSTER_IMPORT_MAX_ROWS:
+            raise RosterTooLarge(f"roster has more than {ROSTER_IMPORT_MAX_ROWS} rows")
+        full_name, file_number, error = normalize_row(raw)
+        result = {"row": row_num, "file_number": file_number}
+        if error:
+            result.update(status="invalid", error=error)
+        elif file_number in existing:
+            result["status"] = "exists"
+        elif file_number in seen:
+            result["status"] = "duplicate"
+        else:
+            seen.add(file_number)
+            result["status"] = "created"
+            pending.append((len(results), full_name, file_number))
+        results.append(result)
+        if len(pending) >= ROSTER_IMPORT_CHUNK:
+            flush()
+    if pending:
+        flush()
+    return created, results
@@ -1,7 +1,18 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
+from sqlalchemy.exc import IntegrityError
+import jwt
+import os
 from db import SessionLocal
-from models import Session, Response as StudentResponse, Student, Classroom
-from sockets import socketio
+from models import Response as StudentResponse
+from sockets import socketio, broadcast_words
+from cache import session_cache
+from aggregates import cloud_aggregator
+from writer import response_writer, claim_slots, insert_responses, CommitPending
+from slides import slide_store, SLIDE_CONTENT_TYPES
+from auth import issue_student_token, decode_student_token
+from ratelimit import submit_limiter, RateLimited
+from normalize import normalize_word, Stopword
+from query_budget import query_budget
 
 student_bp = Blueprint("student", __name__)
 
@@ -9,6 +20,7 @@ student_bp = Blueprint("student", __name__)
 # CHECK SESSION VALIDITY (for student join)
 # -------------------------------------------------
 @student_bp.post("/check-session")
+@query_budget(2)  # session + roster on a cache miss
 def check_session():
     data = request.get_json() or {}
     code = (data.get("code") or "").strip().upper()
@@ -22,33 +34,29 @@ def check_session():
 
     db = SessionLocal()
     try:
-        s = db.query(Session).filter_by(code=code).first()
+        s = session_cache.get(db, code)
         if not s:
             return jsonify({"success": False, "error": "no session with this code exists"}), 404
 
         # Check if file number exists in the class associated with this session
-        if not s.classroom:
+        if s.class_id is None:
             return jsonify({"success": False, "error": "session has no associated class"}), 400
 
-        student = db.query(Student).filter_by(
-            class_id=s.classroom.id,
-            file_number=file_number
-        ).first()
-        
+        student = s.students.get(file_number)
         if not student:
             return jsonify({"success": False, "error": "file number not found in this class"}), 404
 
-        # Get teacher name through classroom relationship
-        teacher_name = "Teacher"
-        if s.classroom.teacher:
-            teacher_name = s.classroom.teacher.full_name
+        teacher_name = s.teacher_name or "Teacher"
+        submit_limiter.size_session(s.code, len(s.students), s.word_limit)
 
         # allow join even if inactive - submission will be blocked later
         return jsonify({
             "success": True, 
             "title": f"Word Cloud – {teacher_name}",
             "is_active": s.is_active,
-            "student_name": student.full_name
+            "student_name": student.full_name,
+            # lets /submit skip the session and roster lookups
+            "student_token": issue_student_token(s, student),
         })
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -57,72 +65,316 @@ def check_session():
 
 
 # -------------------------------------------------
-# SUBMIT WORD
+# RATE LIMITING (before any DB access)
 # -------------------------------------------------
-@student_bp.post("/submit")
-def submit_word():
-    data = request.get_json() or {}
+def rate_limit(code, file_number, token, cost=1):
+    """Spend `cost` from the client, session and student buckets; RateLimited if empty.
+
+    Token submissions are keyed by the student id in the (cached) token
+    claims, the others by file number. The client bucket (RATE_LIMIT_BY_CLIENT)
+    is keyed by the remote address, taken from X-Forwarded-For when
+    PROXY_HOPS is set, which the code and file number cannot change.
+    """
+    student_key = file_number
+    if token:
+        try:
+            claims = decode_student_token(token)
+            code, student_key = claims["code"], f"id:{claims['student_id']}"
+        except jwt.InvalidTokenError:
+            pass
+    submit_limiter.check(code, student_key, cost, client=request.remote_addr)
+
+
+def rate_limited_body(e):
+    return {"success": False, "error": "too many submissions, slow down", "retry_after": e.retry_after_header}
+
+
+# -------------------------------------------------
+# SUBMITTER RESOLUTION
+# -------------------------------------------------
+def resolve_submitter(db, code, file_number, token=None):
+    """Identify who is submitting to which session.
+
+    Returns (submitter, None) or (None, (error, status)). A valid student
+    token from check-session skips the session and roster lookups; only the
+    active flag is checked, from the session cache when possible.
+    """
+    if token:
+        try:
+            claims = decode_student_token(token)
+        except jwt.InvalidTokenError:
+            claims = None
+        if claims and (not code or code == claims["code"]):
+            if not session_cache.is_active(db, claims["code"], claims["session_id"]):
+                return None, ("session is not active", 403)
+            return {
+                "code": claims["code"],
+                "session_id": claims["session_id"],
+                "student_id": claims["student_id"],
+                "name": claims["name"],
+                "word_limit": claims["word_limit"],
+            }, None
+        if not (code and file_number):
+            return None, ("invalid or expired student token", 401)
+
+    if not code:
+        return None, ("missing fields", 400)
+    if not file_number:
+        return None, ("missing file number", 400)
+
+    s = session_cache.get(db, code)
+    if not s:
+        return None, ("invalid session", 404)
+
+    # block submission if session is inactive
+    if not s.is_active:
+        return None, ("session is not active", 403)
+
+    # Get student by file number in the class
+    if s.class_id is None:
+        return None, ("session has no associated class", 400)
+
+    student = s.students.get(file_number)
+    if not student:
+        return None, ("file number not found in this class", 404)
+
+    return {
+        "code": s.code,
+        "session_id": s.id,
+        "student_id": student.id,
+        "name": student.full_name,
+        "word_limit": s.word_limit,
+    }, None
+
+
+# -------------------------------------------------
+# SUBMIT WORD (shared by HTTP and Socket.IO)
+# -------------------------------------------------
+MAX_WORD_LENGTH = StudentResponse.__table__.c.word.type.length
+
+
+def process_submission(data):
+    """Validate and persist one word. Returns (body, http_status)."""
     code = (data.get("code") or "").strip().upper()
     file_number = (data.get("file_number") or "").strip()
     word = (data.get("word") or "").strip()
+    token = data.get("token")
 
-    if not code or not word:
-        return jsonify({"success": False, "error": "missing fields"}), 400
-    
-    if not file_number:
-        return jsonify({"success": False, "error": "missing file number"}), 400
+    if not word:
+        return {"success": False, "error": "missing fields"}, 400
+    if len(word) > MAX_WORD_LENGTH:
+        return {"success": False, "error": "word too long"}, 400
+
+    try:
+        rate_limit(code, file_number, token)
+    except RateLimited as e:
+        return rate_limited_body(e), 429
 
     db = SessionLocal()
     try:
-        s = db.query(Session).filter_by(code=code).first()
-        if not s:
-            return jsonify({"success": False, "error": "invalid session"}), 404
+        submitter, error = resolve_submitter(db, code, file_number, token)
+        if error:
+            message, status = error
+            return {"success": False, "error": message}, status
+        try:
+            key = normalize_word(word)
+        except Stopword:
+            return {"success": False, "error": "stopwords are not counted"}, 400
 
-        # block submission if session is inactive
-        if not s.is_active:
-            return jsonify({"success": False, "error": "session is not active"}), 403
+        # save response; the per-student word limit is enforced atomically
+        # with the insert (group-committed when batching is enabled)
+        row = {
+            "student_id": submitter["student_id"],
+            "word": word,
+            "normalized": key,
+            "session_id": submitter["session_id"],
+        }
+        remaining = response_writer.write(db, row, submitter["word_limit"])
+        if remaining is None:
+            return {"success": False, "error": "limit reached", "remaining": 0}, 403
+        publish_submission(submitter, row)
 
-        # Get student by file number in the class
-        if not s.classroom:
-            return jsonify({"success": False, "error": "session has no associated class"}), 400
+        return {"success": True, "message": "word submitted successfully", "remaining": remaining}, 200
+    except CommitPending as e:
+        # neither saved nor failed yet: don't let the client assume either
+        e.future.add_done_callback(lambda future: publish_if_saved(future, submitter, row))
+        return {"success": False, "pending": True, "error": "submission not confirmed yet, it may still be saved"}, 202
+    except IntegrityError:
+        # token outlived the student (removed from the class)
+        db.rollback()
+        return {"success": False, "error": "file number not found in this class"}, 404
+    except Exception as e:
+        db.rollback()
+        print("[ERROR]", e)
+        return {"success": False, "error": str(e)}, 500
+    finally:
+        db.close()
 
-        student = db.query(Student).filter_by(
-            class_id=s.classroom.id,
-            file_number=file_number
-        ).first()
 
-        if not student:
-            return jsonify({"success": False, "error": "file number not found in this class"}), 404
+def publish_submission(submitter, row):
+    cloud_aggregator.record(row["session_id"], row["normalized"], row["student_id"], row["id"])
+    # broadcast to teacher dashboard in real time (coalesced per tick)
+    broadcast_words(submitter["code"], [row["normalized"]], submitter["name"])
 
-        # enforce word limit per student
-        count = (
-            db.query(StudentResponse)
-            .filter_by(session_id=s.id, student_id=student.id)
-            .count()
-        )
-        if count >= s.word_limit:
-            return jsonify({"success": False, "error": "limit reached"}), 403
-
-        # save response
-        r = StudentResponse(
-            student_id=student.id,
-            word=word,
-            session_id=s.id,
+
+def publish_if_saved(future, submitter, row):
+    """Done callback for a submission that timed out waiting for its batch."""
+    if not future.cancelled() and future.exception() is None and future.result() is not None:
+        publish_submission(submitter, row)
+
+
+@student_bp.post("/submit")
+def submit_word():
+    body, status = process_submission(request.get_json() or {})
+    return with_retry_after(jsonify(body), body), status
+
+
+def with_retry_after(response, body):
+    if "retry_after" in body:
+        response.headers["Retry-After"] = body["retry_after"]
+    return response
+
+
+# -------------------------------------------------
+# SUBMIT SEVERAL WORDS IN ONE REQUEST
+# -------------------------------------------------
+SUBMIT_BATCH_MAX = int(os.getenv("SUBMIT_BATCH_MAX", "20"))
+
+
+@student_bp.post("/submit-batch")
+def submit_batch():
+    data = request.get_json() or {}
+    code = (data.get("code") or "").strip().upper()
+    file_number = (data.get("file_number") or "").strip()
+    words = data.get("words")
+
+    if not isinstance(words, list) or not words:
+        return jsonify({"success": False, "error": "words must be a non-empty list"}), 400
+    if len(words) > SUBMIT_BATCH_MAX:
+        return jsonify({"success": False, "error": f"at most {SUBMIT_BATCH_MAX} words per request"}), 400
+
+    # check lengths first; words are only normalized once the submitter is
+    # known, as in process_submission
+    results = []
+    for raw in words:
+        word = raw.strip() if isinstance(raw, str) else ""
+        if not word:
+            results.append({"word": raw, "accepted": False, "error": "empty word"})
+        elif len(word) > MAX_WORD_LENGTH:
+            results.append({"word": word, "accepted": False, "error": "word too long"})
+        else:
+            results.append({"word": word, "accepted": None})
+
+    try:
+        rate_limit(code, file_number, data.get("token"),
+                   cost=max(1, sum(r["accepted"] is None for r in results)))
+    except RateLimited as e:
+        body = rate_limited_body(e)
+        return with_retry_after(jsonify(body), body), 429
+
+    db = SessionLocal()
+    try:
+        submitter, error = resolve_submitter(db, code, file_number, data.get("token"))
+        if error:
+            message, status = error
+            return jsonify({"success": False, "error": message}), status
+
+        # only words that survive normalization compete for quota
+        for r in results:
+            if r["accepted"] is None:
+                try:
+                    r["normalized"] = normalize_word(r["word"])
+                except Stopword:
+                    r.update(accepted=False, error="stopword")
+        valid = [r for r in results if r["accepted"] is None]
+
+        granted, remaining = claim_slots(
+            db, submitter["session_id"], submitter["student_id"], submitter["word_limit"], len(valid)
         )
-        db.add(r)
+        for i, r in enumerate(valid):
+            r["accepted"] = i < granted
+            if not r["accepted"]:
+                r["error"] = "limit reached"
+        accepted = valid[:granted]
+        keys = [r["normalized"] for r in accepted]
+
+        # one multi-row INSERT in the same transaction as the quota claim
+        rows = [
+            {"student_id": submitter["student_id"], "word": r["word"], "normalized": r["normalized"],
+             "session_id": submitter["session_id"]}
+            for r in accepted
+        ]
+        insert_responses(db, rows)
         db.commit()
 
-        # broadcast to teacher dashboard in real time
-        socketio.emit(
-            "new_word",
-            {"word": word, "name": student.full_name},
-            room=code,
-        )
+        for row in rows:
+            cloud_aggregator.record(row["session_id"], row["normalized"], row["student_id"], row["id"])
+        if accepted:
+            broadcast_words(submitter["code"], keys, submitter["name"])
 
-        return jsonify({"success": True, "message": "word submitted successfully"})
+        body = {
+            "success": bool(accepted),
+            "accepted": len(accepted),
+            "remaining": remaining,
+            "results": results,
+        }
+        if not accepted:
+            body["error"] = "limit reached" if valid else "no valid words"
+            return jsonify(body), 403 if valid else 400
+        return jsonify(body)
+    except IntegrityError:
+        db.rollback()
+        return jsonify({"success": False, "error": "file number not found in this class"}), 404
     except Exception as e:
         db.rollback()
         print("[ERROR]", e)
         return jsonify({"success": False, "error": str(e)}), 500
     finally:
         db.close()
+
+
+@socketio.on("submit_word")
+def handle_submit_word(data):
+    """Same as POST /submit over the student's existing socket; the reply is the ack."""
+    if not isinstance(data, dict):
+        return {"success": False, "error": "missing fields", "status": 400}
+    body, status = process_submission(data)
+    return {**body, "status": status}
+
+
+# -------------------------------------------------
+# SLIDE IMAGES (content-addressed, immutable)
+# -------------------------------------------------
+@student_bp.get("/slides/<slide_hash>")
+def get_slide(slide_hash):
+    slide_hash = slide_hash.lower()
+    # the hash is the content, so a matching ETag never needs a lookup
+    if slide_hash in request.if_none_match:
+        resp = Response(status=304)
+        resp.headers["X-Content-Type-Options"] = "nosniff"
+        resp.set_etag(slide_hash)
+        resp.cache_control.public = True
+        resp.cache_control.max_age = 31536000
+        resp.cache_control.immutable = True
+        return resp
+
+    db = SessionLocal()
+    try:
+        slide = slide_store.get(db, slide_hash)
+    finally:
+        db.close()
+    if not slide:
+        return jsonify({"success": False, "error": "slide not found"}), 404
+
+    data, content_type = slide
+    if content_type not in SLIDE_CONTENT_TYPES:
+        # stored before types were sniffed; never let a browser render it
+        content_type = "application/octet-stream"
+    resp = Response(data, mimetype=content_type)
+    resp.headers["X-Content-Type-Options"] = "nosniff"
+    resp.set_etag(slide_hash)
+    resp.cache_control.public = True
+    resp.cache_control.max_age = 31536000
+    resp.cache_control.immutable = True
+    # handles If-None-Match / If-Range and serves 206 partial content
+    return resp.make_conditional(request, accept_ranges=True, complete_length=len(data))
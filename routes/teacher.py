@@ -1,14 +1,41 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from db import SessionLocal
-from models import Teacher, Session, Classroom, Student
-from utils import hash_password, verify_password, generate_code
+from models import Teacher, Session, Classroom, Student, SubmissionCounter, Response as StudentResponse
+from utils import hash_password, verify_password, needs_rehash, generate_code, HashingBusy
 from datetime import datetime, timedelta
 from functools import wraps
-import jwt, os
+import jwt
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
 from sockets import socketio
+from cache import session_cache
+from aggregates import cloud_aggregator
+from ratelimit import submit_limiter
+from session_state import session_states
+from slides import slide_store, slide_ref, InvalidSlide, SlideTooLarge
+from auth import encode_token, decode_token, revoke_token, TokenRevoked
+from query_budget import query_budget
+from exports import (
+    EXPORT_FORMATS,
+    EXPORT_RETRY_AFTER,
+    acquire_export_slot,
+    release_export_slot,
+    stream_export,
+    session_export_query,
+    class_export_query,
+)
+from summaries import (
+    SESSION_HISTORY_PAGE,
+    SESSION_HISTORY_MAX_PAGE,
+    summarize_session,
+    backfill_class,
+    discard_summaries,
+    history_page,
+    summary_dict,
+)
+from roster import import_roster, iter_roster, roster_format, InvalidRoster, RosterTooLarge
 
 teacher_bp = Blueprint("teacher", __name__)
-SECRET_KEY = os.getenv("JWT_SECRET", "devsecret")
 
 
 # -------------------------------------------------
@@ -21,16 +48,28 @@ def require_auth(f):
         if not token:
             return jsonify({"success": False, "error": "missing token"}), 401
         try:
-            decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+            decoded = decode_token(token)
+            if "teacher_id" not in decoded:
+                # e.g. a student join token signed with the same key
+                raise jwt.InvalidTokenError("not a teacher token")
             request.teacher_id = decoded["teacher_id"]
+            request.token_claims = decoded
         except jwt.ExpiredSignatureError:
             return jsonify({"success": False, "error": "token expired"}), 401
+        except TokenRevoked:
+            return jsonify({"success": False, "error": "token revoked"}), 401
         except jwt.InvalidTokenError:
             return jsonify({"success": False, "error": "invalid token"}), 401
         return f(*args, **kwargs)
     return wrapper
 
 
+def busy_response(e):
+    resp = jsonify({"success": False, "error": "server busy, please retry shortly"})
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp, 503
+
+
 # -------------------------------------------------
 # REGISTER
 # -------------------------------------------------
@@ -50,6 +89,9 @@ def register_teacher():
         db.add(teacher)
         db.commit()
         return jsonify({"success": True, "message": "account created successfully"})
+    except HashingBusy as e:
+        db.rollback()
+        return busy_response(e)
     except Exception as e:
         db.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
@@ -69,12 +111,20 @@ def login_teacher():
         if not teacher or not verify_password(data["password"], teacher.password_hash):
             return jsonify({"success": False, "error": "invalid credentials"}), 401
 
+        # transparently upgrade hashes created with an older cost factor
+        if needs_rehash(teacher.password_hash):
+            try:
+                teacher.password_hash = hash_password(data["password"])
+                db.commit()
+            except HashingBusy:
+                db.rollback()
+
         payload = {
             "teacher_id": teacher.id,
             "email": teacher.email,
             "exp": datetime.utcnow() + timedelta(hours=1),
         }
-        token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+        token = encode_token(payload)
 
         return jsonify(
             {
@@ -84,6 +134,8 @@ def login_teacher():
                 "name": teacher.full_name,
             }
         )
+    except HashingBusy as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
     finally:
@@ -99,6 +151,16 @@ def verify_token():
     return jsonify({"success": True, "message": "Token is valid"})
 
 
+# -------------------------------------------------
+# LOGOUT
+# -------------------------------------------------
+@teacher_bp.post("/logout")
+@require_auth
+def logout_teacher():
+    revoke_token(request.headers.get("Authorization"), request.token_claims)
+    return jsonify({"success": True, "message": "logged out"})
+
+
 # -------------------------------------------------
 # CREATE SESSION
 # -------------------------------------------------
@@ -153,6 +215,8 @@ def create_session():
         db.add(session)
         db.commit()
         db.refresh(session)
+        # the code may have been probed (and remembered as missing) before
+        session_cache.invalidate(code)
         return jsonify({"success": True, "code": code})
     except Exception as e:
         db.rollback()
@@ -183,18 +247,34 @@ def start_session():
         if not session:
             return jsonify({"success": False, "error": "session not found"}), 404
 
+        # store the image once (deduplicated by content hash); clients
+        # only ever receive the hash and a cacheable URL
+        slide_hash = slide_store.put(db, slide_image) if slide_image else None
+
         session.is_active = True
         session.start_time = datetime.utcnow()
+        session.slide_hash = slide_hash
+        # a restarted session gets a fresh rollup when it ends again
+        discard_summaries(db, session_ids=[session.id])
         db.commit()
+        session_cache.invalidate(session.code)
+        slide = slide_ref(slide_hash)
+        session_states.update(session.code, session.id, is_active=True, slide=slide)
 
         # broadcast to students
         socketio.emit(
             "slide_image",
-            {"code": session.code, "slide": slide_image},
+            {"code": session.code, "slide": slide},
             room=session.code,
         )
 
-        return jsonify({"success": True, "message": "session started"})
+        return jsonify({"success": True, "message": "session started", "slide": slide})
+    except SlideTooLarge as e:
+        db.rollback()
+        return jsonify({"success": False, "error": str(e)}), 413
+    except InvalidSlide as e:
+        db.rollback()
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         db.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
@@ -206,6 +286,7 @@ def start_session():
 # END SESSION
 # -------------------------------------------------
 @teacher_bp.post("/end-session")
+@query_budget(8)  # end + roster size + rollup (two GROUP BYs, upsert the summary row)
 @require_auth
 def end_session():
     data = request.get_json()
@@ -217,7 +298,23 @@ def end_session():
 
         session.is_active = False
         session.end_time = datetime.utcnow()
+        if session.class_id is not None:
+            # the rollup keeps this even if the roster changes later
+            session.roster_size = db.query(func.count(Student.id)).filter(
+                Student.class_id == session.class_id
+            ).scalar()
         db.commit()
+        session_cache.invalidate(session.code)
+        session_states.update(session.code, session.id, is_active=False)
+
+        # roll the session up once; if this fails the history view builds it lazily
+        if session.class_id is not None:
+            try:
+                summarize_session(db, session)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"[SUMMARY] Could not summarize session {session.code}:", e)
         return jsonify({"success": True, "message": "session ended"})
     except Exception as e:
         db.rollback()
@@ -226,6 +323,140 @@ def end_session():
         db.close()
 
 
+# -------------------------------------------------
+# WORD CLOUD SNAPSHOT
+# -------------------------------------------------
+def int_arg(name, default=None):
+    """Integer query parameter; ValueError if it is given but does not parse.
+
+    (`request.args.get(name, type=int)` would silently fall back to the default.)
+    """
+    raw = request.args.get(name)
+    if raw is None:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+
+
+@teacher_bp.get("/sessions/<code>/cloud")
+@require_auth
+def session_cloud(code):
+    try:
+        top = int_arg("top")
+        min_count = int_arg("min_count", 1)
+        if top is not None and top < 1:
+            return jsonify({"success": False, "error": "top must be a positive integer"}), 400
+        if min_count < 1:
+            min_count = 1
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    db = SessionLocal()
+    try:
+        s = session_cache.get(db, code.strip().upper())
+        if not s or s.teacher_id != request.teacher_id:
+            return jsonify({"success": False, "error": "session not found"}), 404
+
+        cloud = cloud_aggregator.snapshot(db, s.id, top=top, min_count=min_count)
+        return jsonify({
+            "success": True,
+            "code": s.code,
+            "is_active": s.is_active,
+            "rate_limited": submit_limiter.rejections(s.code),
+            **cloud,
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+    finally:
+        db.close()
+
+
+# -------------------------------------------------
+# SESSION HISTORY (rollups, keyset pagination)
+# -------------------------------------------------
+@teacher_bp.get("/classes/<int:class_id>/sessions")
+@query_budget(8)  # ownership, backfill (check + rollup of any missing), one page
+@require_auth
+def session_history(class_id):
+    try:
+        limit = int_arg("limit", SESSION_HISTORY_PAGE)
+        before = int_arg("before")
+        top = int_arg("top")
+        if limit < 1:
+            return jsonify({"success": False, "error": "limit must be a positive integer"}), 400
+        if top is not None and top < 1:
+            return jsonify({"success": False, "error": "top must be a positive integer"}), 400
+        limit = min(limit, SESSION_HISTORY_MAX_PAGE)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    db = SessionLocal()
+    try:
+        owned = db.query(Classroom.id).filter_by(id=class_id, teacher_id=request.teacher_id).first()
+        if not owned:
+            return jsonify({"success": False, "error": "class not found"}), 404
+
+        if backfill_class(db, class_id):
+            db.commit()
+        summaries, next_cursor = history_page(db, class_id, before=before, limit=limit)
+        return jsonify({
+            "success": True,
+            "sessions": [summary_dict(summary, top=top) for summary in summaries],
+            "next_cursor": next_cursor,
+        })
+    except Exception as e:
+        db.rollback()
+        return jsonify({"success": False, "error": str(e)}), 500
+    finally:
+        db.close()
+
+
+# -------------------------------------------------
+# EXPORTS (streamed CSV / NDJSON)
+# -------------------------------------------------
+def export_response(query, filename):
+    fmt = request.args.get("format", "csv").lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"success": False, "error": "format must be csv or ndjson"}), 400
+    if not acquire_export_slot():
+        resp = jsonify({"success": False, "error": "too many exports running, try again shortly"})
+        resp.headers["Retry-After"] = str(EXPORT_RETRY_AFTER)
+        return resp, 503
+    resp = Response(stream_with_context(stream_export(query, fmt)), mimetype=EXPORT_FORMATS[fmt])
+    resp.headers["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    # closed when the download finishes or the client goes away
+    resp.call_on_close(release_export_slot)
+    return resp
+
+
+@teacher_bp.get("/sessions/<code>/export")
+@require_auth
+def export_session(code):
+    db = SessionLocal()
+    try:
+        s = session_cache.get(db, code.strip().upper())
+    finally:
+        db.close()
+    if not s or s.teacher_id != request.teacher_id:
+        return jsonify({"success": False, "error": "session not found"}), 404
+    return export_response(session_export_query(s.id), f"session-{s.code}")
+
+
+@teacher_bp.get("/classes/<int:class_id>/export")
+@require_auth
+def export_class(class_id):
+    db = SessionLocal()
+    try:
+        owned = db.query(Classroom.id).filter_by(id=class_id, teacher_id=request.teacher_id).first()
+    finally:
+        db.close()
+    if not owned:
+        return jsonify({"success": False, "error": "class not found"}), 404
+    return export_response(class_export_query(class_id), f"class-{class_id}")
+
+
 # -------------------------------------------------
 # CLASS MANAGEMENT
 # -------------------------------------------------
@@ -253,18 +484,27 @@ def create_class():
 
 
 @teacher_bp.get("/classes")
+@query_budget(1)
 @require_auth
 def list_classes():
     db = SessionLocal()
     try:
-        classes = db.query(Classroom).filter_by(teacher_id=request.teacher_id).all()
+        # one GROUP BY for the counts instead of loading every roster
+        classes = (
+            db.query(Classroom.id, Classroom.name, func.count(Student.id).label("student_count"))
+            .outerjoin(Student, Student.class_id == Classroom.id)
+            .filter(Classroom.teacher_id == request.teacher_id)
+            .group_by(Classroom.id, Classroom.name)
+            .order_by(Classroom.id)
+            .all()
+        )
         return jsonify({
             "success": True,
             "classes": [
                 {
                     "id": c.id,
                     "name": c.name,
-                    "student_count": len(c.students),
+                    "student_count": c.student_count,
                 }
                 for c in classes
             ]
@@ -276,16 +516,34 @@ def list_classes():
 
 
 @teacher_bp.delete("/classes/<int:class_id>")
+@query_budget(7)  # ownership + one DELETE per table
 @require_auth
 def delete_class(class_id):
     db = SessionLocal()
     try:
-        classroom = db.query(Classroom).filter_by(id=class_id, teacher_id=request.teacher_id).first()
-        if not classroom:
+        owned = db.query(Classroom.id).filter_by(id=class_id, teacher_id=request.teacher_id).first()
+        if not owned:
             return jsonify({"success": False, "error": "class not found"}), 404
 
-        db.delete(classroom)
+        # bulk deletes, children first, rather than an ORM cascade that
+        # loads every student's and session's responses one by one
+        session_ids = select(Session.id).where(Session.class_id == class_id)
+        student_ids = select(Student.id).where(Student.class_id == class_id)
+        db.query(StudentResponse).filter(
+            StudentResponse.session_id.in_(session_ids) | StudentResponse.student_id.in_(student_ids)
+        ).delete(synchronize_session=False)
+        db.query(SubmissionCounter).filter(
+            SubmissionCounter.session_id.in_(session_ids) | SubmissionCounter.student_id.in_(student_ids)
+        ).delete(synchronize_session=False)
+        discard_summaries(db, class_id=class_id)
+        deleted_sessions = db.scalars(
+            delete(Session).where(Session.class_id == class_id).returning(Session.id)
+        ).all()
+        db.query(Student).filter(Student.class_id == class_id).delete(synchronize_session=False)
+        db.query(Classroom).filter(Classroom.id == class_id).delete(synchronize_session=False)
         db.commit()
+        session_cache.invalidate_class(class_id)
+        cloud_aggregator.discard(deleted_sessions)
         return jsonify({"success": True, "message": "class deleted"})
     except Exception as e:
         db.rollback()
@@ -328,7 +586,67 @@ def create_student(class_id):
         )
         db.add(student)
         db.commit()
+        session_cache.invalidate_class(class_id)
         return jsonify({"success": True, "student": {"id": student.id, "full_name": student.full_name, "file_number": student.file_number}})
+    except IntegrityError:
+        # lost a race with a concurrent insert of the same file number
+        db.rollback()
+        return jsonify({"success": False, "error": "file number already exists in this class"}), 400
+    except Exception as e:
+        db.rollback()
+        return jsonify({"success": False, "error": str(e)}), 500
+    finally:
+        db.close()
+
+
+@teacher_bp.post("/classes/<int:class_id>/students/import")
+@query_budget(None)  # one INSERT per ROSTER_IMPORT_CHUNK new students
+@require_auth
+def import_students(class_id):
+    """Bulk-add students from a CSV, JSON array or NDJSON roster.
+
+    The roster is the request body (Content-Type picks the format) or a
+    multipart upload named "file". Rows whose file number is already in
+    the class, or repeated in the upload, are skipped; the rest are
+    created in one transaction.
+    """
+    upload = request.files.get("file")
+    try:
+        if upload is not None:
+            fmt = roster_format(upload.mimetype, upload.filename)
+            stream = upload.stream
+        else:
+            fmt = roster_format(request.mimetype)
+            stream = request.stream
+    except InvalidRoster as e:
+        return jsonify({"success": False, "error": str(e)}), 415
+
+    db = SessionLocal()
+    try:
+        owned = db.query(Classroom.id).filter_by(id=class_id, teacher_id=request.teacher_id).first()
+        if not owned:
+            return jsonify({"success": False, "error": "class not found"}), 404
+
+        created, results = import_roster(db, class_id, iter_roster(stream, fmt))
+        db.commit()
+        if created:
+            session_cache.invalidate_class(class_id)
+        return jsonify({
+            "success": True,
+            "created": created,
+            "skipped": len(results) - created,
+            "results": results,
+        })
+    except InvalidRoster as e:
+        db.rollback()
+        return jsonify({"success": False, "error": str(e)}), 400
+    except RosterTooLarge as e:
+        db.rollback()
+        return jsonify({"success": False, "error": str(e)}), 413
+    except IntegrityError:
+        # a student was added to the class while the roster was importing
+        db.rollback()
+        return jsonify({"success": False, "error": "roster changed during import, please retry"}), 409
     except Exception as e:
         db.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
@@ -337,19 +655,26 @@ def create_student(class_id):
 
 
 @teacher_bp.get("/classes/<int:class_id>/students")
+@query_budget(2)
 @require_auth
 def list_students(class_id):
     db = SessionLocal()
     try:
-        classroom = db.query(Classroom).filter_by(id=class_id, teacher_id=request.teacher_id).first()
-        if not classroom:
+        owned = db.query(Classroom.id).filter_by(id=class_id, teacher_id=request.teacher_id).first()
+        if not owned:
             return jsonify({"success": False, "error": "class not found"}), 404
 
+        students = (
+            db.query(Student.id, Student.full_name, Student.file_number)
+            .filter(Student.class_id == class_id)
+            .order_by(Student.id)
+            .all()
+        )
         return jsonify({
             "success": True,
             "students": [
                 {"id": s.id, "full_name": s.full_name, "file_number": s.file_number}
-                for s in classroom.students
+                for s in students
             ]
         })
     except Exception as e:
@@ -359,20 +684,29 @@ def list_students(class_id):
 
 
 @teacher_bp.delete("/classes/<int:class_id>/students/<int:student_id>")
+@query_budget(5)
 @require_auth
 def delete_student(class_id, student_id):
     db = SessionLocal()
     try:
-        classroom = db.query(Classroom).filter_by(id=class_id, teacher_id=request.teacher_id).first()
-        if not classroom:
+        owned = db.query(Classroom.id).filter_by(id=class_id, teacher_id=request.teacher_id).first()
+        if not owned:
             return jsonify({"success": False, "error": "class not found"}), 404
 
-        student = db.query(Student).filter_by(id=student_id, class_id=class_id).first()
-        if not student:
+        # their responses go first (rather than by ON DELETE CASCADE with the
+        # student row) so we learn which sessions' rollups and clouds counted them
+        session_ids = list(set(db.scalars(
+            delete(StudentResponse).where(StudentResponse.student_id == student_id).returning(StudentResponse.session_id)
+        )))
+        discard_summaries(db, session_ids=session_ids)
+        deleted = db.query(Student).filter_by(id=student_id, class_id=class_id).delete(synchronize_session=False)
+        if not deleted:
+            db.rollback()
             return jsonify({"success": False, "error": "student not found"}), 404
-
-        db.delete(student)
+        db.query(SubmissionCounter).filter(SubmissionCounter.student_id == student_id).delete(synchronize_session=False)
         db.commit()
+        session_cache.invalidate_class(class_id)
+        cloud_aggregator.discard(session_ids)
         return jsonify({"success": True, "message": "student deleted"})
     except Exception as e:
         db.rollback()
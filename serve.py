@@ -0,0 +1,90 @@
+"""Production entry point: run several app workers on one machine.
+
+Each worker is a separate `main.py` process listening on its own port
+(PORT, PORT+1, ...). Workers relay Socket.IO emits and share session
+state through SOCKETIO_MESSAGE_QUEUE / SHARED_STATE_URL; when neither is
+set, a local hub is started in this process and used instead of Redis.
+
+Socket.IO long-polling needs sticky sessions, so put a proxy that pins
+clients to a worker (e.g. nginx `ip_hash`) in front of the worker ports.
+
+    python serve.py --workers 4 --port 5000
+"""
+import argparse
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HUB_URL = os.getenv("HUB_URL", "hub://127.0.0.1:5099")
+WORKER_RESTART_DELAY = float(os.getenv("WORKER_RESTART_DELAY", "1"))
+# workers get SHUTDOWN_GRACE_SECONDS to drain; kill them if they take much longer
+SHUTDOWN_WAIT = float(os.getenv("SHUTDOWN_GRACE_SECONDS", "10")) + 5
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "5000")))
+    parser.add_argument("--async-mode", choices=("threading", "gevent"),
+                        default=os.getenv("SOCKETIO_ASYNC_MODE", "gevent"))
+    args = parser.parse_args()
+
+    env = dict(os.environ, SOCKETIO_ASYNC_MODE=args.async_mode)
+    hub = None
+    if args.workers > 1 and not (env.get("SOCKETIO_MESSAGE_QUEUE") or env.get("SHARED_STATE_URL")):
+        # a fresh key per run unless one is configured; only this process
+        # and the workers it starts know it
+        os.environ["HUB_AUTHKEY"] = env["HUB_AUTHKEY"] = env.get("HUB_AUTHKEY") or secrets.token_hex(32)
+        from shared import HubServer
+        hub = HubServer(HUB_URL)
+        hub.start()
+        env["SOCKETIO_MESSAGE_QUEUE"] = env["SHARED_STATE_URL"] = HUB_URL
+
+    # migrate once here rather than racing N workers through it
+    from migrations import ensure_schema
+    ensure_schema()
+    env["MIGRATE_ON_STARTUP"] = "false"
+
+    def spawn(i):
+        worker_env = dict(env, PORT=str(args.port + i), WORKER_ID=str(i))
+        return subprocess.Popen([sys.executable, os.path.join(HERE, "main.py")], env=worker_env)
+
+    workers = [spawn(i) for i in range(args.workers)]
+    print(f"[SERVE] {args.workers} workers on ports {args.port}-{args.port + args.workers - 1}")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while not stopping:
+        time.sleep(0.5)
+        for i, proc in enumerate(workers):
+            if proc.poll() is not None and not stopping:
+                print(f"[SERVE] Worker {i} exited with {proc.returncode}; restarting")
+                time.sleep(WORKER_RESTART_DELAY)
+                workers[i] = spawn(i)
+
+    print("[SERVE] Shutting down workers")
+    for proc in workers:
+        if proc.poll() is None:
+            proc.terminate()
+    for proc in workers:
+        try:
+            proc.wait(timeout=SHUTDOWN_WAIT)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    if hub is not None:
+        hub.close()
+
+
+if __name__ == "__main__":
+    main()
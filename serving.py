@@ -0,0 +1,130 @@
+"""Web server selection for production.
+
+Imported by main.py before anything else so gevent can monkey-patch the
+standard library first; keep this module free of app imports.
+"""
+import os
+import signal
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# -------------------------------------------------
+# CONFIGURATION
+# -------------------------------------------------
+# threading: Werkzeug, one OS thread per connection (development / fallback)
+# gevent:    gevent's WSGI server, one greenlet per connection
+SOCKETIO_ASYNC_MODE = os.getenv("SOCKETIO_ASYNC_MODE", "threading").lower()
+SOCKETIO_PING_INTERVAL = int(os.getenv("SOCKETIO_PING_INTERVAL", "25"))
+SOCKETIO_PING_TIMEOUT = int(os.getenv("SOCKETIO_PING_TIMEOUT", "20"))
+# largest Socket.IO message accepted; slides are uploaded over HTTP, not sockets
+SOCKETIO_MAX_MESSAGE_BYTES = int(os.getenv("SOCKETIO_MAX_MESSAGE_BYTES", str(64 * 1024)))
+# concurrent connections (HTTP + sockets) per worker; gevent only
+SERVER_MAX_CONNECTIONS = int(os.getenv("SERVER_MAX_CONNECTIONS", "2000"))
+# idle HTTP keep-alive connections are closed after this many seconds; must
+# stay above the ping interval so quiet websockets are not cut
+SERVER_KEEPALIVE_TIMEOUT = int(os.getenv("SERVER_KEEPALIVE_TIMEOUT", "75"))
+SHUTDOWN_GRACE_SECONDS = float(os.getenv("SHUTDOWN_GRACE_SECONDS", "10"))
+# proxies in front of the app that append to X-Forwarded-For (1 on Render or
+# behind the nginx in front of serve.py); 0 trusts no forwarded headers
+PROXY_HOPS = int(os.getenv("PROXY_HOPS", "0"))
+
+ASYNC_MODES = ("threading", "gevent")
+if SOCKETIO_ASYNC_MODE not in ASYNC_MODES:
+    raise ValueError(f"SOCKETIO_ASYNC_MODE must be one of {ASYNC_MODES}, got {SOCKETIO_ASYNC_MODE!r}")
+
+
+def monkey_patch():
+    """Make blocking stdlib calls cooperative (gevent mode only)."""
+    if SOCKETIO_ASYNC_MODE == "gevent":
+        from gevent import monkey
+        monkey.patch_all()
+
+
+def socketio_options():
+    """Server options for SocketIO.init_app."""
+    return {
+        "async_mode": SOCKETIO_ASYNC_MODE,
+        "ping_interval": SOCKETIO_PING_INTERVAL,
+        "ping_timeout": SOCKETIO_PING_TIMEOUT,
+        "max_http_buffer_size": SOCKETIO_MAX_MESSAGE_BYTES,
+    }
+
+
+def trust_proxy(app):
+    """Take the client address and scheme from the last PROXY_HOPS forwarded headers.
+
+    Call after SocketIO.init_app so sockets see the same address as requests.
+    """
+    if PROXY_HOPS > 0:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS, x_proto=PROXY_HOPS)
+
+
+def make_psycopg2_green():
+    """Let psycopg2 yield to other greenlets while waiting on the database.
+
+    psycopg2 talks to libpq directly, so monkey-patching sockets does not
+    reach it; without this one slow query stalls every connection.
+    """
+    import psycopg2
+    from psycopg2 import extensions
+    from gevent.socket import wait_read, wait_write
+
+    def wait_callback(conn, timeout=None):
+        while True:
+            state = conn.poll()
+            if state == extensions.POLL_OK:
+                return
+            if state == extensions.POLL_READ:
+                wait_read(conn.fileno(), timeout=timeout)
+            elif state == extensions.POLL_WRITE:
+                wait_write(conn.fileno(), timeout=timeout)
+            else:
+                raise psycopg2.OperationalError(f"bad result from poll: {state!r}")
+
+    extensions.set_wait_callback(wait_callback)
+
+
+# -------------------------------------------------
+# SERVER
+# -------------------------------------------------
+def run(app, socketio, host, port, on_shutdown):
+    """Serve `app` until SIGTERM/SIGINT, then call `on_shutdown` and stop."""
+    if SOCKETIO_ASYNC_MODE == "gevent":
+        _run_gevent(app, socketio, host, port, on_shutdown)
+    else:
+        _run_threading(app, socketio, host, port, on_shutdown)
+
+
+def _run_threading(app, socketio, host, port, on_shutdown):
+    print("[SERVER] Werkzeug (threading mode); set SOCKETIO_ASYNC_MODE=gevent in production")
+
+    def stop(signum, frame):
+        on_shutdown()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    socketio.run(app, host=host, port=port, allow_unsafe_werkzeug=True)
+
+
+def _run_gevent(app, socketio, host, port, on_shutdown):
+    import gevent
+    from gevent import pywsgi
+
+    class KeepAliveHandler(pywsgi.WSGIHandler):
+        def handle(self):
+            self.socket.settimeout(SERVER_KEEPALIVE_TIMEOUT)
+            super().handle()
+
+    def stop():
+        on_shutdown()
+        socketio.wsgi_server.stop(timeout=SHUTDOWN_GRACE_SECONDS)
+
+    gevent.signal_handler(signal.SIGTERM, stop)
+    gevent.signal_handler(signal.SIGINT, stop)
+    print(f"[SERVER] gevent, up to {SERVER_MAX_CONNECTIONS} connections")
+    socketio.run(app, host=host, port=port, spawn=SERVER_MAX_CONNECTIONS, handler_class=KeepAliveHandler)
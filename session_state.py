@@ -0,0 +1,86 @@
+import os
+import threading
+from collections import OrderedDict
+
+from shared import shared_store
+
+# -------------------------------------------------
+# CONFIGURATION
+# -------------------------------------------------
+SESSION_STATE_SIZE = int(os.getenv("SESSION_STATE_SIZE", "512"))
+
+
+# -------------------------------------------------
+# LIVE SESSION STATE
+# -------------------------------------------------
+class SessionState:
+    """What a client needs to render a session it just joined."""
+
+    def __init__(self, code, session_id, is_active=False, slide=None):
+        self.code = code
+        self.session_id = session_id
+        self.is_active = is_active
+        self.slide = slide
+
+    def to_dict(self):
+        return {"code": self.code, "is_active": self.is_active, "slide": self.slide}
+
+
+class SessionStateStore:
+    """Per-process LRU of SessionState keyed by session code.
+
+    With a distributed backend (several workers) the states live in the
+    shared store instead, so every worker sees the same active flag and slide.
+    """
+
+    def __init__(self, maxsize=SESSION_STATE_SIZE, backend=shared_store):
+        self.maxsize = maxsize
+        self.shared = backend if backend.distributed else None
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, code):
+        if self.shared is not None:
+            value = self.shared.get(self._key(code))
+            return SessionState(code, **value) if value else None
+        with self._lock:
+            state = self._states.get(code)
+            if state is not None:
+                self._states.move_to_end(code)
+            return state
+
+    def update(self, code, session_id, **fields):
+        """Create or update the state for `code` and return it."""
+        if self.shared is not None:
+            state = self.get(code) or SessionState(code, session_id)
+            for name, value in fields.items():
+                setattr(state, name, value)
+            self.shared.set(self._key(code), {
+                "session_id": state.session_id, "is_active": state.is_active, "slide": state.slide,
+            })
+            return state
+        with self._lock:
+            state = self._states.get(code)
+            if state is None:
+                state = SessionState(code, session_id)
+                self._states[code] = state
+                while len(self._states) > self.maxsize:
+                    self._states.popitem(last=False)
+            else:
+                self._states.move_to_end(code)
+            for name, value in fields.items():
+                setattr(state, name, value)
+            return state
+
+    def discard(self, code):
+        if self.shared is not None:
+            self.shared.delete(self._key(code))
+        with self._lock:
+            self._states.pop(code, None)
+
+    @staticmethod
+    def _key(code):
+        return f"session_state:{code}"
+
+
+session_states = SessionStateStore()
@@ -0,0 +1,381 @@
+import hmac
+import json
+import os
+import socket
+import struct
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+
+import socketio as socketio_server
+
+# -------------------------------------------------
+# CONFIGURATION
+# -------------------------------------------------
+# Where Socket.IO relays emits between workers: empty (single process),
+# redis://host:6379/0 (needs the redis package) or hub://127.0.0.1:5099
+# (the local hub started by serve.py).
+SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE", "")
+# Where workers keep shared session state and exchange cache invalidations;
+# same URL schemes plus memory:// (this process only).
+SHARED_STATE_URL = os.getenv("SHARED_STATE_URL") or SOCKETIO_MESSAGE_QUEUE or "memory://"
+# shared secret for hub:// connections; serve.py generates one for the hub
+# it starts. Required: any local process that knows it can use the hub
+HUB_AUTHKEY = os.getenv("HUB_AUTHKEY", "").encode()
+KEY_PREFIX = "wordcloud:"
+
+
+def _hub_address(url):
+    parsed = urlparse(url)
+    return parsed.hostname or "127.0.0.1", parsed.port or 5099
+
+
+def _require_hub_authkey():
+    if not HUB_AUTHKEY:
+        raise RuntimeError("hub:// needs HUB_AUTHKEY (serve.py sets one for the workers it starts)")
+
+
+# -------------------------------------------------
+# STATE BACKENDS
+# -------------------------------------------------
+# get/set/delete JSON-able values; publish/listen on named channels.
+class MemoryBackend:
+    """Single-process backend; nothing is shared and publish is a no-op."""
+
+    distributed = False
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._values.get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self._values[key] = value
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def publish(self, channel, message):
+        pass
+
+    def listen(self, channel):
+        return iter(())
+
+
+class RedisBackend:
+    distributed = True
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(f"{url} needs the redis package: pip install redis")
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._redis.get(KEY_PREFIX + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        self._redis.set(KEY_PREFIX + key, json.dumps(value))
+
+    def delete(self, key):
+        self._redis.delete(KEY_PREFIX + key)
+
+    def publish(self, channel, message):
+        self._redis.publish(KEY_PREFIX + channel, json.dumps(message))
+
+    def listen(self, channel):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(KEY_PREFIX + channel)
+        for message in pubsub.listen():
+            if message.get("type") == "message":
+                yield json.loads(message["data"])
+
+
+class HubConnection:
+    """Length-prefixed JSON over a plain socket.
+
+    Plain sockets (rather than multiprocessing.connection) so the hub
+    client stays cooperative when gevent has patched the socket module.
+    JSON rather than pickle, like the Redis backends, so a message can
+    carry data but never code.
+    """
+
+    _header = struct.Struct("!I")
+
+    def __init__(self, sock):
+        self.sock = sock
+        self._rfile = sock.makefile("rb")
+
+    @classmethod
+    def connect(cls, address):
+        _require_hub_authkey()
+        conn = cls(socket.create_connection(address))
+        conn.send_bytes(HUB_AUTHKEY)
+        return conn
+
+    def send_bytes(self, data):
+        self.sock.sendall(self._header.pack(len(data)) + data)
+
+    def recv_bytes(self):
+        header = self._rfile.read(self._header.size)
+        if len(header) < self._header.size:
+            raise EOFError("hub connection closed")
+        (size,) = self._header.unpack(header)
+        data = self._rfile.read(size)
+        if len(data) < size:
+            raise EOFError("hub connection closed")
+        return data
+
+    def send(self, obj):
+        self.send_bytes(json.dumps(obj, separators=(",", ":")).encode())
+
+    def recv(self):
+        return json.loads(self.recv_bytes())
+
+    def close(self):
+        self._rfile.close()
+        self.sock.close()
+
+
+class HubBackend:
+    """Client of the local hub (HubServer), for running several workers on one machine."""
+
+    distributed = True
+
+    def __init__(self, url):
+        self.address = _hub_address(url)
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._call("get", key)
+
+    def set(self, key, value):
+        self._call("set", key, value)
+
+    def delete(self, key):
+        self._call("delete", key)
+
+    def publish(self, channel, message):
+        self._call("publish", channel, message)
+
+    def listen(self, channel):
+        conn = HubConnection.connect(self.address)
+        conn.send(("subscribe", channel))
+        try:
+            while True:
+                yield conn.recv()
+        finally:
+            conn.close()
+
+    def _call(self, *request):
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._conn is None:
+                        self._conn = HubConnection.connect(self.address)
+                    self._conn.send(request)
+                    return self._conn.recv()
+                except (OSError, EOFError):
+                    # hub restarted or connection dropped; reconnect once
+                    self._conn = None
+                    if attempt:
+                        raise
+
+
+def make_backend(url):
+    scheme = urlparse(url).scheme
+    if scheme == "memory":
+        return MemoryBackend()
+    if scheme in ("redis", "rediss"):
+        return RedisBackend(url)
+    if scheme == "hub":
+        return HubBackend(url)
+    raise ValueError(f"unsupported shared state URL: {url}")
+
+
+# -------------------------------------------------
+# LOCAL HUB (stand-in for Redis on a single machine)
+# -------------------------------------------------
+class HubServer:
+    """Key-value store plus pub/sub for workers on the same machine.
+
+    Each connection authenticates with HUB_AUTHKEY and then sends requests;
+    a connection that sends ("subscribe", channel) only receives that
+    channel's messages from then on.
+    """
+
+    def __init__(self, url):
+        _require_hub_authkey()
+        self.address = _hub_address(url)
+        self._values = {}
+        self._subscribers = {}  # channel -> [(conn, send lock)]
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def start(self):
+        self._listener = socket.create_server(self.address)
+        threading.Thread(target=self._accept, name="hub-accept", daemon=True).start()
+        print(f"[HUB] Listening on {self.address[0]}:{self.address[1]}")
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.close()
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self._listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(HubConnection(sock),), daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            if not hmac.compare_digest(conn.recv_bytes(), HUB_AUTHKEY):
+                print("[HUB] Rejected connection with a bad auth key")
+                conn.close()
+                return
+            while True:
+                try:
+                    op, *args = conn.recv()
+                except (ValueError, TypeError):
+                    print("[HUB] Dropped a connection that sent a malformed request")
+                    conn.close()
+                    return
+                if op == "subscribe":
+                    with self._lock:
+                        self._subscribers.setdefault(args[0], []).append((conn, threading.Lock()))
+                    return
+                conn.send(self._handle(op, args))
+        except (EOFError, OSError):
+            conn.close()
+
+    def _handle(self, op, args):
+        if op == "get":
+            with self._lock:
+                return self._values.get(args[0])
+        if op == "set":
+            with self._lock:
+                self._values[args[0]] = args[1]
+            return None
+        if op == "delete":
+            with self._lock:
+                self._values.pop(args[0], None)
+            return None
+        if op == "publish":
+            channel, message = args
+            with self._lock:
+                subscribers = list(self._subscribers.get(channel, ()))
+            delivered = 0
+            for conn, send_lock in subscribers:
+                try:
+                    with send_lock:
+                        conn.send(message)
+                    delivered += 1
+                except OSError:
+                    with self._lock:
+                        self._subscribers[channel].remove((conn, send_lock))
+            return delivered
+        raise ValueError(f"unknown hub operation {op!r}")
+
+
+class HubManager(socketio_server.PubSubManager):
+    """Socket.IO client manager that relays emits between workers through the hub."""
+
+    name = "hub"
+
+    def __init__(self, url, channel="flask-socketio", write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.backend = HubBackend(url)
+
+    def _publish(self, data):
+        self.backend.publish(self.channel, data)
+
+    def _listen(self):
+        yield from self.backend.listen(self.channel)
+
+
+# -------------------------------------------------
+# CROSS-WORKER EVENT BUS
+# -------------------------------------------------
+class SharedBus:
+    """Fans out cache invalidations and live-cloud updates to the other workers.
+
+    Handlers run for messages published by other workers only; the
+    publisher is expected to have applied the change locally already.
+    """
+
+    channel = "bus"
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.worker_id = uuid.uuid4().hex
+        self._handlers = {}
+        self._thread = None
+        self._lock = threading.Lock()
+        self.published = 0
+        self.received = 0
+
+    def on(self, topic, handler):
+        self._handlers[topic] = handler
+        if self.backend.distributed:
+            self._ensure_listening()
+
+    def publish(self, topic, **payload):
+        if not self.backend.distributed:
+            return
+        try:
+            self.backend.publish(self.channel, {"topic": topic, "origin": self.worker_id, **payload})
+            self.published += 1
+        except Exception as e:
+            print(f"[SHARED] Could not publish {topic}:", e)
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__,
+            "worker_id": self.worker_id,
+            "published": self.published,
+            "received": self.received,
+        }
+
+    def _ensure_listening(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="shared-bus", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                for message in self.backend.listen(self.channel):
+                    if message.get("origin") == self.worker_id:
+                        continue
+                    handler = self._handlers.get(message.get("topic"))
+                    if handler is not None:
+                        self.received += 1
+                        handler(message)
+            except Exception as e:
+                print("[SHARED] Bus listener failed, reconnecting:", e)
+                time.sleep(1.0)
+
+
+shared_store = make_backend(SHARED_STATE_URL)
+bus = SharedBus(shared_store)
+
+
+def message_queue_options():
+    """Extra SocketIO.init_app options for cross-process emits."""
+    if not SOCKETIO_MESSAGE_QUEUE:
+        return {}
+    if SOCKETIO_MESSAGE_QUEUE.startswith("hub://"):
+        return {"client_manager": HubManager(SOCKETIO_MESSAGE_QUEUE)}
+    return {"message_queue": SOCKETIO_MESSAGE_QUEUE}
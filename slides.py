@@ -0,0 +1,170 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from models import Slide
+
+# -------------------------------------------------
+# CONFIGURATION
+# -------------------------------------------------
+SLIDE_MAX_BYTES = int(os.getenv("SLIDE_MAX_BYTES", str(10 * 1024 * 1024)))
+# decoded slides kept in memory so a class fetching the same slide costs one DB read
+SLIDE_CACHE_BYTES = int(os.getenv("SLIDE_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+_DATA_URL = re.compile(r"^data:(?P<type>[\w.+-]+/[\w.+-]+)?(;[^,]*)?;base64,", re.IGNORECASE)
+SLIDE_CONTENT_TYPES = {"image/png", "image/jpeg", "image/gif", "image/webp"}
+_MAGIC = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+class InvalidSlide(ValueError):
+    pass
+
+
+class SlideTooLarge(ValueError):
+    pass
+
+
+def slide_url(slide_hash):
+    return f"/api/student/slides/{slide_hash}" if slide_hash else None
+
+
+def slide_ref(slide_hash):
+    """What clients get instead of the image itself."""
+    if not slide_hash:
+        return None
+    return {"hash": slide_hash, "url": slide_url(slide_hash)}
+
+
+def sniff_image_type(data):
+    """Image type from the file's magic bytes, or None."""
+    content_type = next((t for magic, t in _MAGIC if data.startswith(magic)), None)
+    if content_type is None and data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        content_type = "image/webp"
+    return content_type
+
+
+def decode_slide(encoded):
+    """Decode a base64 string or data URL into (bytes, content_type).
+
+    The type is sniffed from the bytes, never taken from the data URL, and
+    anything that is not a known image is rejected: slides are served from
+    the API origin.
+    """
+    match = _DATA_URL.match(encoded)
+    if match:
+        encoded = encoded[match.end():]
+    # ~3/4 of the base64 length; reject before decoding multi-MB junk
+    if len(encoded) * 3 // 4 > SLIDE_MAX_BYTES:
+        raise SlideTooLarge("slide image too large")
+    try:
+        data = base64.b64decode(encoded, validate=False)
+    except (binascii.Error, ValueError):
+        raise InvalidSlide("slide image is not valid base64")
+    if not data:
+        raise InvalidSlide("slide image is empty")
+    content_type = sniff_image_type(data)
+    if content_type is None:
+        raise InvalidSlide("slide must be a PNG, JPEG, GIF or WebP image")
+    return data, content_type
+
+
+# -------------------------------------------------
+# SLIDE STORE
+# -------------------------------------------------
+class SlideStore:
+    """Content-addressed slide images in the `slides` table (sha256 of the bytes)."""
+
+    def __init__(self, cache_bytes=SLIDE_CACHE_BYTES):
+        self.cache_bytes = cache_bytes
+        self._cache = OrderedDict()  # hash -> (data, content_type)
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.deduplicated = 0
+
+    def put(self, db, encoded):
+        """Store a base64 slide (deduplicated) and return its hash. Does not commit.
+
+        Only the hash is read to check for an existing copy, never the
+        blob. The slide is cached on its first get(), once it is committed.
+        """
+        data, content_type = decode_slide(encoded)
+        slide_hash = hashlib.sha256(data).hexdigest()
+        if self._cached(slide_hash) or db.scalar(select(Slide.hash).where(Slide.hash == slide_hash)):
+            self.deduplicated += 1
+            return slide_hash
+        if self._insert(db, {"hash": slide_hash, "content_type": content_type, "size": len(data), "data": data}):
+            self.stored += 1
+        else:
+            # stored concurrently by another request
+            self.deduplicated += 1
+        return slide_hash
+
+    def get(self, db, slide_hash):
+        """(data, content_type) for `slide_hash`, or None."""
+        cached = self._cached(slide_hash)
+        if cached:
+            return cached
+        slide = db.get(Slide, slide_hash)
+        if slide is None:
+            return None
+        self._remember(slide_hash, slide.data, slide.content_type)
+        return slide.data, slide.content_type
+
+    @staticmethod
+    def _insert(db, values):
+        dialect = db.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            stmt = insert(Slide.__table__).values(**values).on_conflict_do_nothing()
+            return db.execute(stmt).rowcount == 1
+        try:
+            with db.begin_nested():
+                db.execute(Slide.__table__.insert().values(**values))
+            return True
+        except IntegrityError:
+            return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "cached": len(self._cache),
+                "cached_bytes": self._cached_bytes,
+                "stored": self.stored,
+                "deduplicated": self.deduplicated,
+            }
+
+    def _cached(self, slide_hash):
+        with self._lock:
+            item = self._cache.get(slide_hash)
+            if item is not None:
+                self._cache.move_to_end(slide_hash)
+            return item
+
+    def _remember(self, slide_hash, data, content_type):
+        if len(data) > self.cache_bytes:
+            return
+        with self._lock:
+            if slide_hash in self._cache:
+                return
+            self._cache[slide_hash] = (data, content_type)
+            self._cached_bytes += len(data)
+            while self._cached_bytes > self.cache_bytes:
+                _, (old, _) = self._cache.popitem(last=False)
+                self._cached_bytes -= len(old)
+
+
+slide_store = SlideStore()
@@ -1,16 +1,202 @@
+import os
+import threading
+from flask import request
 from flask_socketio import SocketIO, join_room, leave_room, emit
+from db import SessionLocal
+from cache import session_cache
+from aggregates import cloud_aggregator
+from session_state import session_states
+from slides import slide_ref
 
 socketio = SocketIO(cors_allowed_origins="*")
 
+# -------------------------------------------------
+# BROADCAST CONFIGURATION
+# -------------------------------------------------
+# Submissions are coalesced into one "cloud_delta" per room per tick.
+# SOCKET_LEGACY_NEW_WORD=true restores one "new_word" event per submission.
+SOCKET_TICK_MS = int(os.getenv("SOCKET_TICK_MS", "150"))
+SOCKET_LEGACY_NEW_WORD = os.getenv("SOCKET_LEGACY_NEW_WORD", "false").lower() in ("1", "true", "yes")
+# refuse new sockets beyond this many per worker (0 = no limit)
+SOCKET_MAX_CONNECTIONS = int(os.getenv("SOCKET_MAX_CONNECTIONS", "0"))
+
+
+# -------------------------------------------------
+# PER-ROOM COALESCER
+# -------------------------------------------------
+class RoomCoalescer:
+    """Collects submissions per room and flushes them as one event per tick."""
+
+    def __init__(self, tick_ms=SOCKET_TICK_MS):
+        self.tick = max(10, tick_ms) / 1000.0
+        self._pending = {}  # room -> {"words": {word: n}, "names": [..]}
+        self._lock = threading.Lock()
+        self._task = None
+        self.ticks = 0
+        self.events = 0
+        self.submissions = 0
+
+    def add(self, room, words, name):
+        with self._lock:
+            delta = self._pending.setdefault(room, {"words": {}, "names": []})
+            for word in words:
+                delta["words"][word] = delta["words"].get(word, 0) + 1
+                self.submissions += 1
+            if name not in delta["names"]:
+                delta["names"].append(name)
+            if self._task is None:
+                self._task = socketio.start_background_task(self._run)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for room, delta in pending.items():
+            socketio.emit(
+                "cloud_delta",
+                {"code": room, "words": delta["words"], "names": delta["names"]},
+                room=room,
+            )
+        self.events += len(pending)
+
+    def stats(self):
+        return {
+            "tick_ms": int(self.tick * 1000),
+            "ticks": self.ticks,
+            "events": self.events,
+            "submissions": self.submissions,
+        }
+
+    def _run(self):
+        while True:
+            socketio.sleep(self.tick)
+            self.ticks += 1
+            if self._pending:
+                self.flush()
+
+
+coalescer = RoomCoalescer()
+
+
+def broadcast_words(code, words, name):
+    """Announce accepted submissions to everyone in the session room."""
+    if SOCKET_LEGACY_NEW_WORD:
+        for word in words:
+            socketio.emit("new_word", {"word": word, "name": name}, room=code)
+    else:
+        coalescer.add(code, words, name)
+
+
+# -------------------------------------------------
+# CONNECTION LIMITS + GRACEFUL DRAIN
+# -------------------------------------------------
+class ConnectionGate:
+    """Tracks connected sockets, enforces the cap and refuses sockets while draining."""
+
+    def __init__(self, max_connections=SOCKET_MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self.draining = False
+        self._sids = set()
+        self._lock = threading.Lock()
+        self.refused = 0
+
+    def admit(self, sid):
+        with self._lock:
+            full = self.max_connections and len(self._sids) >= self.max_connections
+            if self.draining or full:
+                self.refused += 1
+                return False
+            self._sids.add(sid)
+            return True
+
+    def release(self, sid):
+        with self._lock:
+            self._sids.discard(sid)
+
+    def close(self):
+        """Refuse new sockets from now on."""
+        with self._lock:
+            self.draining = True
+
+    def drain(self, grace=0.5):
+        """Ask connected clients to reconnect elsewhere, then disconnect them."""
+        self.close()
+        with self._lock:
+            sids = list(self._sids)
+        if not sids:
+            return
+        # only this worker's clients: a broadcast would go through the
+        # message queue to every worker's sockets
+        for sid in sids:
+            socketio.emit("server_shutdown", {"reconnect": True}, to=sid, ignore_queue=True)
+        socketio.sleep(grace)
+        for sid in sids:
+            socketio.server.disconnect(sid)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "connected": len(self._sids),
+                "max_connections": self.max_connections,
+                "refused": self.refused,
+                "draining": self.draining,
+            }
+
+
+connection_gate = ConnectionGate()
+
+
+@socketio.on("connect")
+def handle_connect(auth=None):
+    return connection_gate.admit(request.sid)
+
+
+@socketio.on("disconnect")
+def handle_disconnect(reason=None):
+    connection_gate.release(request.sid)
+
+
+# -------------------------------------------------
+# ROOM MEMBERSHIP
+# -------------------------------------------------
 @socketio.on("join_session")
 def handle_join(data):
-    code = data.get("code")
+    code = (data.get("code") or "").strip().upper()
     if code:
         join_room(code)
-        emit("system", {"message": f"joined session {code}"}, room=code)
+        # reply to the joining socket only; a room-wide broadcast here turns
+        # every reconnect storm into N^2 messages
+        emit("system", {"message": f"joined session {code}"})
+        snapshot = session_snapshot(code)
+        if snapshot:
+            emit("session_state", snapshot)
+
+
+def session_snapshot(code):
+    """Current active state, slide and cloud for a late joiner, or None."""
+    # a db session only checks out a connection once it is queried, so the
+    # warm path (state and cloud both resident) never touches the pool
+    db = SessionLocal()
+    try:
+        state = session_states.get(code)
+        if state is None:
+            entry = session_cache.get(db, code)
+            if not entry:
+                return None
+            state = session_states.update(
+                code, entry.id, is_active=entry.is_active, slide=slide_ref(entry.slide_hash)
+            )
+        snapshot = state.to_dict()
+        snapshot["cloud"] = cloud_aggregator.snapshot(db, state.session_id)
+        return snapshot
+    except Exception as e:
+        print("[SOCKET] Could not build session snapshot:", e)
+        return None
+    finally:
+        db.close()
+
 
 @socketio.on("leave_session")
 def handle_leave(data):
-    code = data.get("code")
+    code = (data.get("code") or "").strip().upper()
     if code:
         leave_room(code)
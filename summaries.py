@@ -0,0 +1,172 @@
+import json
+import os
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from models import Response, Session, SessionSummary, Student
+
+# -------------------------------------------------
+# CONFIGURATION
+# -------------------------------------------------
+# words kept per summary, most frequent first
+SESSION_SUMMARY_WORDS = int(os.getenv("SESSION_SUMMARY_WORDS", "100"))
+SESSION_HISTORY_PAGE = int(os.getenv("SESSION_HISTORY_PAGE", "20"))
+SESSION_HISTORY_MAX_PAGE = int(os.getenv("SESSION_HISTORY_MAX_PAGE", "100"))
+
+
+# -------------------------------------------------
+# ROLLUP
+# -------------------------------------------------
+def summarize_sessions(db, sessions):
+    """(Re)compute the rollups of `sessions` from their responses. Does not commit.
+
+    A constant number of statements however many sessions are passed: one
+    GROUP BY session for the totals, one for the word counts, then a single
+    multi-row upsert, so two requests rebuilding the same session both
+    succeed. The roster size is the one stored when the session ended; only
+    sessions ended before that was recorded count the current roster, in
+    one more GROUP BY.
+    """
+    sessions = [s for s in sessions if s.class_id is not None]
+    if not sessions:
+        return 0
+    ids = [s.id for s in sessions]
+    totals = {
+        row[0]: row[1:]
+        for row in db.execute(
+            select(
+                Response.session_id,
+                func.count(Response.id),
+                func.count(func.distinct(Response.student_id)),
+                func.min(Response.submitted_at),
+                func.max(Response.submitted_at),
+            )
+            .where(Response.session_id.in_(ids))
+            .group_by(Response.session_id)
+        )
+    }
+    words = {}
+    for session_id, word, n, students in db.execute(
+        select(
+            Response.session_id,
+            Response.normalized,
+            func.count(Response.id),
+            func.count(func.distinct(Response.student_id)),
+        )
+        .where(Response.session_id.in_(ids))
+        .group_by(Response.session_id, Response.normalized)
+    ):
+        words.setdefault(session_id, []).append((word, n, students))
+    unknown = {s.class_id for s in sessions if s.roster_size is None}
+    rosters = dict(db.execute(
+        select(Student.class_id, func.count(Student.id))
+        .where(Student.class_id.in_(unknown))
+        .group_by(Student.class_id)
+    ).all()) if unknown else {}
+
+    rows = []
+    for s in sessions:
+        total, participants, first, last = totals.get(s.id, (0, 0, None, None))
+        counts = sorted(words.get(s.id, ()), key=lambda w: (-w[1], w[0]))
+        rows.append({
+            "session_id": s.id,
+            "class_id": s.class_id,
+            "code": s.code,
+            "started_at": s.start_time,
+            "ended_at": s.end_time,
+            "total_responses": total,
+            "distinct_words": len(counts),
+            "participants": participants,
+            "roster_size": s.roster_size if s.roster_size is not None else rosters.get(s.class_id, 0),
+            "first_submission_at": first,
+            "last_submission_at": last,
+            "words": json.dumps([list(w) for w in counts[:SESSION_SUMMARY_WORDS]], ensure_ascii=False),
+        })
+    _upsert_summaries(db, rows)
+    return len(rows)
+
+
+def _upsert_summaries(db, rows):
+    table = SessionSummary.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.session_id],
+            set_={c.name: stmt.excluded[c.name] for c in table.c if c.name != "session_id"},
+        )
+        db.execute(stmt, rows)
+        return
+    try:
+        with db.begin_nested():
+            discard_summaries(db, session_ids=[row["session_id"] for row in rows])
+            db.execute(table.insert(), rows)
+    except IntegrityError:
+        pass  # a concurrent rebuild stored the same rollups first
+
+
+def summarize_session(db, session):
+    return summarize_sessions(db, [session])
+
+
+def backfill_class(db, class_id):
+    """Summarize ended sessions of a class that have no rollup yet. Does not commit."""
+    missing = db.scalars(
+        select(Session)
+        .outerjoin(SessionSummary, SessionSummary.session_id == Session.id)
+        .where(
+            Session.class_id == class_id,
+            Session.is_active.is_(False),
+            Session.end_time.isnot(None),
+            SessionSummary.session_id.is_(None),
+        )
+    ).all()
+    return summarize_sessions(db, missing)
+
+
+def discard_summaries(db, class_id=None, session_ids=None):
+    """Drop rollups that no longer match their responses; they are rebuilt on the next read.
+
+    `session_ids` may be a list or a subquery of session ids.
+    """
+    query = db.query(SessionSummary)
+    if session_ids is not None:
+        query = query.filter(SessionSummary.session_id.in_(session_ids))
+    else:
+        query = query.filter(SessionSummary.class_id == class_id)
+    query.delete(synchronize_session=False)
+
+
+# -------------------------------------------------
+# HISTORY (keyset pagination)
+# -------------------------------------------------
+def history_page(db, class_id, before=None, limit=SESSION_HISTORY_PAGE):
+    """Newest summaries first, `limit` per page; pass the returned cursor as `before`."""
+    query = select(SessionSummary).where(SessionSummary.class_id == class_id)
+    if before is not None:
+        query = query.where(SessionSummary.session_id < before)
+    rows = db.scalars(query.order_by(SessionSummary.session_id.desc()).limit(limit + 1)).all()
+    next_cursor = rows[limit - 1].session_id if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def summary_dict(summary, top=None):
+    words = json.loads(summary.words)
+    if top is not None:
+        words = words[:top]
+    return {
+        "session_id": summary.session_id,
+        "code": summary.code,
+        "started_at": summary.started_at.isoformat() if summary.started_at else None,
+        "ended_at": summary.ended_at.isoformat() if summary.ended_at else None,
+        "total_responses": summary.total_responses,
+        "distinct_words": summary.distinct_words,
+        "participants": summary.participants,
+        "roster_size": summary.roster_size,
+        "first_submission_at": summary.first_submission_at.isoformat() if summary.first_submission_at else None,
+        "last_submission_at": summary.last_submission_at.isoformat() if summary.last_submission_at else None,
+        "words": [{"word": w, "count": c, "students": s} for w, c, s in words],
+    }
@@ -0,0 +1,92 @@
+"""Statement budgets of the hot endpoints, enforced with QUERY_BUDGET_STRICT.
+
+A view that issues more SQL statements than its @query_budget (or the
+default QUERY_BUDGET) raises QueryBudgetExceeded instead of answering,
+so an N+1 regression fails here rather than in a classroom.
+
+    python -m pytest -q tests
+"""
+import base64
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "budgets.db")
+os.environ["QUERY_PROFILING"] = "true"
+os.environ["QUERY_BUDGET_STRICT"] = "true"
+os.environ["RATE_LIMITING"] = "false"
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+from main import app  # noqa: E402
+from query_budget import query_profiler  # noqa: E402
+
+CLASS_SIZE = 30
+SLIDE = "data:image/png;base64," + base64.b64encode(b"\x89PNG\r\n\x1a\n" + b"\x00" * 64).decode()
+
+
+@pytest.fixture(scope="module")
+def client():
+    app.testing = True
+    return app.test_client()
+
+
+@pytest.fixture(scope="module")
+def teacher(client):
+    client.post("/api/teacher/register", json={"full_name": "T", "email": "budget@example.com", "password": "pw"})
+    token = client.post("/api/teacher/login", json={"email": "budget@example.com", "password": "pw"}).json["token"]
+    return {"Authorization": token}
+
+
+@pytest.fixture(scope="module")
+def classroom(client, teacher):
+    class_id = client.post("/api/teacher/classes", json={"name": "Budget"}, headers=teacher).json["class"]["id"]
+    for i in range(CLASS_SIZE):
+        client.post(
+            f"/api/teacher/classes/{class_id}/students",
+            json={"full_name": f"Student {i}", "file_number": f"B{i:03d}"},
+            headers=teacher,
+        )
+    return class_id
+
+
+@pytest.fixture(scope="module")
+def session_code(client, teacher, classroom):
+    return client.post(
+        "/api/teacher/create-session", json={"class_id": classroom, "word_limit": 3}, headers=teacher
+    ).json["code"]
+
+
+def ok(response):
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.json
+
+
+def test_list_classes(client, teacher, classroom, session_code):
+    classes = ok(client.get("/api/teacher/classes", headers=teacher))["classes"]
+    assert any(c["id"] == classroom for c in classes)
+
+
+def test_list_students(client, teacher, classroom):
+    assert len(ok(client.get(f"/api/teacher/classes/{classroom}/students", headers=teacher))["students"]) == CLASS_SIZE
+
+
+def test_session_lifecycle(client, teacher, classroom, session_code):
+    ok(client.post("/api/teacher/start-session", json={"code": session_code, "slide_image": SLIDE}, headers=teacher))
+    # the same slide again is deduplicated
+    ok(client.post("/api/teacher/start-session", json={"code": session_code, "slide_image": SLIDE}, headers=teacher))
+
+    for i in range(5):
+        body = ok(client.post("/api/student/check-session", json={"code": session_code, "file_number": f"B{i:03d}"}))
+        ok(client.post("/api/student/submit", json={"token": body["student_token"], "word": f"word {i % 2}"}))
+
+    ok(client.post("/api/teacher/end-session", json={"code": session_code}, headers=teacher))
+    history = ok(client.get(f"/api/teacher/classes/{classroom}/sessions", headers=teacher))
+    assert history["sessions"][0]["total_responses"] == 5
+
+
+def test_nothing_over_budget():
+    assert query_profiler.requests > 0
+    assert query_profiler.over_budget == 0
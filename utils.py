@@ -1,12 +1,96 @@
 import bcrypt
+import os
 import random
 import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import Histogram
+from serving import SOCKETIO_ASYNC_MODE
+
+# -------------------------------------------------
+# PASSWORD HASHING CONFIGURATION
+# -------------------------------------------------
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+# how many hashing jobs may wait behind the busy workers before we shed load
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "16"))
+HASH_RETRY_AFTER = int(os.getenv("HASH_RETRY_AFTER", "2"))
+
+
+class HashingBusy(Exception):
+    """Raised when the password hashing pool is saturated."""
+
+    def __init__(self, retry_after=HASH_RETRY_AFTER):
+        super().__init__("password hashing pool is saturated")
+        self.retry_after = retry_after
+
+
+# bcrypt releases the GIL, so a small dedicated pool keeps this CPU work off
+# the request threads that serve sockets and submissions
+if SOCKETIO_ASYNC_MODE == "gevent":
+    # patched threads are greenlets; bcrypt needs real ones or it stalls the hub
+    from gevent.threadpool import ThreadPoolExecutor as _GeventThreadPoolExecutor
+    _hash_pool = _GeventThreadPoolExecutor(max_workers=HASH_WORKERS)
+else:
+    _hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE_LIMIT)
+
+hash_duration = Histogram("password_hash_seconds", "Time spent inside bcrypt")
+hash_queue_wait = Histogram("password_hash_queue_wait_seconds", "Time hashing jobs waited for a worker")
+hash_rejected = 0
+
+
+def _run_hashing(fn, *args):
+    global hash_rejected
+    if not _hash_slots.acquire(blocking=False):
+        hash_rejected += 1
+        raise HashingBusy()
+
+    queued_at = time.perf_counter()
+
+    def job():
+        started = time.perf_counter()
+        hash_queue_wait.observe(started - queued_at)
+        try:
+            return fn(*args)
+        finally:
+            hash_duration.observe(time.perf_counter() - started)
+
+    try:
+        future = _hash_pool.submit(job)
+    except Exception:
+        _hash_slots.release()
+        raise
+    future.add_done_callback(lambda _: _hash_slots.release())
+    return future.result()
+
 
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    return _run_hashing(bcrypt.hashpw, password.encode(), salt).decode()
 
 def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode(), hashed.encode())
+    return _run_hashing(bcrypt.checkpw, password.encode(), hashed.encode())
+
+def needs_rehash(hashed: str) -> bool:
+    """True if `hashed` was created with a lower cost than BCRYPT_ROUNDS."""
+    try:
+        # "$2b$12$<salt+hash>"
+        return int(hashed.split("$")[2]) < BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+def hashing_stats() -> dict:
+    return {
+        "rounds": BCRYPT_ROUNDS,
+        "workers": HASH_WORKERS,
+        "queue_limit": HASH_QUEUE_LIMIT,
+        "rejected": hash_rejected,
+        "hash_seconds": hash_duration.snapshot(),
+        "queue_wait_seconds": hash_queue_wait.snapshot(),
+    }
 
 def generate_code(length: int = 6) -> str:
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
@@ -0,0 +1,274 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from db import SessionLocal
+from models import Response, SubmissionCounter
+
+# -------------------------------------------------
+# CONFIGURATION
+# -------------------------------------------------
+RESPONSE_BATCHING = os.getenv("RESPONSE_BATCHING", "false").lower() in ("1", "true", "yes")
+RESPONSE_BATCH_SIZE = int(os.getenv("RESPONSE_BATCH_SIZE", "50"))
+RESPONSE_BATCH_INTERVAL_MS = int(os.getenv("RESPONSE_BATCH_INTERVAL_MS", "20"))
+RESPONSE_QUEUE_SIZE = int(os.getenv("RESPONSE_QUEUE_SIZE", "1000"))
+RESPONSE_COMMIT_TIMEOUT = float(os.getenv("RESPONSE_COMMIT_TIMEOUT", "10"))
+
+
+def insert_responses(db, rows):
+    """Insert response rows (dicts) with a single multi-row INSERT. Does not commit.
+
+    Sets each row's "id", which the word cloud uses to skip rows it already counted.
+    """
+    if rows:
+        table = Response.__table__
+        inserted = db.execute(table.insert().returning(table.c.id, sort_by_parameter_order=True), rows)
+        for row, (response_id,) in zip(rows, inserted):
+            row["id"] = response_id
+
+
+def claim_slot(db, session_id, student_id, word_limit):
+    """Atomically take one of a student's `word_limit` submission slots.
+
+    Runs in the caller's transaction, so the slot is only spent if the
+    response insert commits with it. Returns the number of slots left, or
+    None if the limit was already reached. Safe across workers: the
+    conditional UPDATE serializes on the counter row.
+    """
+    counter = SubmissionCounter.__table__
+    bump = (
+        update(counter)
+        .where(
+            counter.c.session_id == session_id,
+            counter.c.student_id == student_id,
+            counter.c.count < word_limit,
+        )
+        .values(count=counter.c.count + 1)
+        .returning(counter.c.count)
+    )
+    for _ in range(2):
+        row = db.execute(bump).first()
+        if row is not None:
+            return word_limit - row[0]
+        # no row yet (first word) or limit reached; try to create it at 1
+        if word_limit is None or word_limit < 1:
+            return None
+        if _insert_first_slot(db, session_id, student_id):
+            return word_limit - 1
+        # a row exists: either the limit is reached or a concurrent first
+        # insert beat us, in which case the UPDATE above will now succeed
+    return None
+
+
+def claim_slots(db, session_id, student_id, word_limit, wanted):
+    """Take up to `wanted` slots at once. Returns (granted, remaining).
+
+    Reads the counter and then advances it with a compare-and-set UPDATE
+    (WHERE count = <value read>), retrying if another request moved it in
+    between, so the whole claim costs two statements.
+    """
+    counter = SubmissionCounter.__table__
+    match = (counter.c.session_id == session_id, counter.c.student_id == student_id)
+    if word_limit is None or wanted < 1:
+        return 0, None
+    for _ in range(10):
+        current = db.execute(select(counter.c.count).where(*match)).scalar()
+        granted = max(0, min(wanted, word_limit - (current or 0)))
+        if granted == 0:
+            return 0, 0
+        if current is None:
+            if _insert_first_slot(db, session_id, student_id, granted):
+                return granted, word_limit - granted
+            continue
+        moved = db.execute(
+            update(counter).where(*match, counter.c.count == current).values(count=current + granted)
+        ).rowcount
+        if moved == 1:
+            return granted, word_limit - current - granted
+    raise RuntimeError("could not claim submission slots (counter under heavy contention)")
+
+
+def _insert_first_slot(db, session_id, student_id, count=1):
+    values = {"session_id": session_id, "student_id": student_id, "count": count}
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(SubmissionCounter.__table__).values(**values).on_conflict_do_nothing()
+        return db.execute(stmt).rowcount == 1
+    try:
+        with db.begin_nested():
+            db.execute(SubmissionCounter.__table__.insert().values(**values))
+        return True
+    except IntegrityError:
+        return False
+
+
+# -------------------------------------------------
+# GROUP-COMMIT WRITER
+# -------------------------------------------------
+class CommitPending(Exception):
+    """A queued row was not confirmed within RESPONSE_COMMIT_TIMEOUT; it may still commit."""
+
+    def __init__(self, future):
+        super().__init__("response not confirmed yet")
+        self.future = future
+
+
+class ResponseWriter:
+    """Write-behind buffer that commits Response rows in batches.
+
+    Callers block on the future of the batch their row landed in, so a
+    submission is only acknowledged once it is durable. When batching is
+    disabled, or the queue is full, rows go through the per-row path.
+    """
+
+    def __init__(
+        self,
+        enabled=RESPONSE_BATCHING,
+        batch_size=RESPONSE_BATCH_SIZE,
+        interval_ms=RESPONSE_BATCH_INTERVAL_MS,
+        queue_size=RESPONSE_QUEUE_SIZE,
+    ):
+        self.enabled = enabled
+        self.batch_size = max(1, batch_size)
+        self.interval = max(0, interval_ms) / 1000.0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._stopping = False
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+        self.max_batch = 0
+        self.fallbacks = 0
+        self.failures = 0
+
+    def write(self, db, row, word_limit):
+        """Persist one response row if the student still has a slot.
+
+        Returns the slots left after this word, or None if the word limit
+        was reached; a saved row gets its "id" set. Batched if enabled; raises on failure. A batched row
+        is committed on the writer's own connection, so `db` is closed
+        (its connection back in the pool) while waiting; raises
+        CommitPending if the batch has not committed in time.
+        """
+        if self.enabled and not self._stopping:
+            future = Future()
+            self._ensure_started()
+            try:
+                self._queue.put_nowait((row, word_limit, future))
+            except queue.Full:
+                future = None
+            if future is not None:
+                db.close()
+                try:
+                    return future.result(timeout=RESPONSE_COMMIT_TIMEOUT)
+                except FutureTimeout:
+                    raise CommitPending(future)
+            self.fallbacks += 1
+
+        return self._write_one(db, row, word_limit)
+
+    def stop(self, timeout=5.0):
+        """Stop accepting rows and flush whatever is still queued."""
+        self._stopping = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "queue_depth": self._queue.qsize(),
+            "batch_size": self.batch_size,
+            "interval_ms": int(self.interval * 1000),
+            "batches": self.batches,
+            "rows": self.rows,
+            "max_batch": self.max_batch,
+            "fallbacks": self.fallbacks,
+            "failures": self.failures,
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="response-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+            if stop:
+                return
+
+    @staticmethod
+    def _write_one(db, row, word_limit):
+        remaining = claim_slot(db, row["session_id"], row["student_id"], word_limit)
+        if remaining is None:
+            db.rollback()
+            return None
+        response = Response(**row)
+        db.add(response)
+        db.flush()
+        row["id"] = response.id
+        db.commit()
+        return remaining
+
+    def _flush(self, batch):
+        db = SessionLocal()
+        try:
+            results = [
+                claim_slot(db, row["session_id"], row["student_id"], word_limit)
+                for row, word_limit, _ in batch
+            ]
+            insert_responses(db, [row for (row, _, _), r in zip(batch, results) if r is not None])
+            db.commit()
+        except Exception:
+            db.rollback()
+            self.failures += 1
+            # isolate the bad row(s): retry one at a time so the rest still land
+            for row, word_limit, future in batch:
+                try:
+                    future.set_result(self._write_one(db, row, word_limit))
+                except Exception as e:
+                    db.rollback()
+                    future.set_exception(e)
+            return
+        finally:
+            db.close()
+
+        self.batches += 1
+        self.rows += len(batch)
+        self.max_batch = max(self.max_batch, len(batch))
+        for (_, _, future), remaining in zip(batch, results):
+            future.set_result(remaining)
+
+
+response_writer = ResponseWriter()
+atexit.register(response_writer.stop)